@@ -32,12 +32,12 @@ async def upload_dataset(
         if not csv_file.filename or not csv_file.filename.lower().endswith('.csv'):
             raise HTTPException(status_code=400, detail="File must be a CSV file")
         
-        # Read file content as bytes
-        csv_content = await csv_file.read()
-        
-        # Validate file is not empty
-        if not csv_content:
+        # Validate file is not empty - checked via the file size, without reading the upload into memory.
+        # Starlette spools uploads over 1MB to a temp file on disk, which is passed to the service as is
+        csv_file.file.seek(0, 2)
+        if csv_file.file.tell() == 0:
             raise HTTPException(status_code=400, detail="CSV file is empty")
+        csv_file.file.seek(0)
         
         # Parse JSON-encoded enrichment_column_list string into list 
         enrichment_column_list_parsed = []
@@ -59,7 +59,7 @@ async def upload_dataset(
             lead_column=lead_column,
             enrichment_column_list=enrichment_column_list_parsed,
             enrichment_column_exists=enrichment_column_exists,
-            csv_content=csv_content
+            csv_file=csv_file.file
         )
         
         return result
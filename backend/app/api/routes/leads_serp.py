@@ -42,7 +42,7 @@ async def generate_urls(project_id: int, request: QueryListRequest):
     2. Generate URLs from queries and save them to serp_urls table
     """
     try:
-        result = leads_serp_service.save_queries_and_generate_urls(project_id, request.queries)
+        result = await leads_serp_service.save_queries_and_generate_urls(project_id, request.queries)
         return result
     except ValueError as e:
         # Handle specific validation errors (like foreign key violations)
@@ -132,6 +132,33 @@ async def generate_leads(project_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving queries: {str(e)}")
 
+@router.post("/projects/{project_id}/leads/jobs")
+async def start_leads_job(project_id: int):
+    """
+    Same as generate_leads, but runs in the background and returns straight away.
+    Poll GET /projects/{project_id}/leads/jobs for progress and the result.
+    If a run is already in progress for the project, its status is returned instead.
+    """
+    try:
+        return leads_serp_service.start_extraction_job(project_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting lead extraction: {str(e)}")
+
+@router.get("/projects/{project_id}/leads/jobs")
+async def get_leads_job(project_id: int):
+    """
+    Get progress of the project's background lead extraction:
+    status ("running", "done", "failed"), completed, total, leads_found, failed,
+    result (generate_leads response when done) and detail (error when failed).
+    A finished job stays readable for 10 minutes or until the next run starts; 404 if there is no job.
+    """
+    try:
+        return leads_serp_service.get_extraction_job(project_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 @router.get("/projects/{project_id}/leads/download")
 async def get_latest_run_results(project_id: int):
     """
@@ -22,8 +22,10 @@ class Settings(BaseSettings):
     jina_api_key: str
     google_maps_api_key: str
     
-    # App settings
-    log_level: str = Field(default="INFO") # Only log level has a default
+    # App settings (these have defaults)
+    log_level: str = Field(default="INFO")
+    extraction_concurrency: int = Field(default=8) # Max URLs processed at once by the lead extractors
+    jina_serp_min_interval: float = Field(default=0.0) # Min seconds between Jina SERP requests (e.g. 1.0 on rate-limited plans)
     
     def configure_logging(self):
         """Configure logging based on settings."""
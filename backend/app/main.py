@@ -6,6 +6,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .api.routes import projects, leads_serp, leads_dataset, merged_results, test_lead_extraction_prompts
 from .services.database_service import db_service
+from .utils.scrapers import close_async_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -43,6 +44,11 @@ async def startup_event():
         # Don't crash the app, but log the error
         # The app can still run, but database operations will fail
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the shared Jina HTTP client on shutdown"""
+    await close_async_client()
+
 ########## DEFAULT ENDPOINTS
 
 @app.get("/")
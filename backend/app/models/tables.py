@@ -1,7 +1,7 @@
 """
 PostgreSQL table models for the AI Lead Generator
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
@@ -68,7 +68,7 @@ class SerpLead(Base):
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id", ondelete='CASCADE'), nullable=False)  # Foreign key to Project.id
     serp_url_id = Column(Integer, ForeignKey("serp_urls.id", ondelete='CASCADE'), nullable=False)  # Foreign key to SerpUrl.id
-    lead = Column(Text, nullable=False)  # The extracted lead/company name
+    lead = Column(Text, nullable=False)  # The extracted lead/company name, normalized via normalize_lead_name on insert
     created_at = Column(DateTime, default=datetime.utcnow)  # When the lead was extracted
     
     # Relationships
@@ -81,13 +81,18 @@ class SerpLeadAggregated(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id", ondelete='CASCADE'), nullable=False)  # Foreign key to Project.id
-    leads = Column(Text, nullable=False)  # The lead/company name (grouped)
+    leads = Column(Text, nullable=False)  # The lead/company name (grouped, already normalized via normalize_lead_name)
     serp_count = Column(Integer, nullable=False, default=0)  # Count of distinct SERP URLs this lead appears in
     created_at = Column(DateTime, default=datetime.utcnow)  # When the aggregated record was created
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # When the aggregated record was last updated
     
     # Relationships
     project = relationship("Project", back_populates="serp_leads_aggregated")
+    
+    # Merges read all aggregated leads for a project and join on the normalized lead name
+    __table_args__ = (
+        Index("ix_serp_leads_aggregated_project_leads", "project_id", "leads"),
+    )
 
 class ProjectDataset(Base):
     """PostgreSQL table: project_datasets - metadata linking projects to datasets"""
@@ -111,12 +116,17 @@ class Dataset(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     project_dataset_id = Column(Integer, ForeignKey("project_datasets.id", ondelete='CASCADE'), nullable=False)  # Foreign key to ProjectDataset.id
-    lead = Column(Text, nullable=False)  # The lead value from lead_column (e.g., company name)
+    lead = Column(Text, nullable=False)  # The lead value from lead_column (e.g., company name), normalized via normalize_lead_name on upload
     enrichment_value = Column(Text)  # The enrichment value - stored as text for flexibility (can be int, bool, float, etc.)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     project_dataset = relationship("ProjectDataset", back_populates="datasets")
+    
+    # Merges read all rows of one uploaded dataset at a time
+    __table_args__ = (
+        Index("ix_datasets_project_dataset_lead", "project_dataset_id", "lead"),
+    )
 
 class MergedResult(Base):
     """PostgreSQL table: merged_results - for storing merged leads from SERP and datasets with enrichment columns"""
@@ -130,6 +140,11 @@ class MergedResult(Base):
     # Relationships
     project = relationship("Project", back_populates="merged_results")
     
+    # One row per lead per project - used for lookups and as the ON CONFLICT target when merging
+    __table_args__ = (
+        Index("ix_merged_results_project_lead", "project_id", "lead", unique=True),
+    )
+    
     # Note: Enrichment columns (bcorp_score, sustainability_rating, etc.) are added dynamically
     # via ALTER TABLE when datasets are uploaded. They are not defined in the model.
 
@@ -17,6 +17,32 @@ from ..models.tables import Base
 
 logger = logging.getLogger(__name__)
 
+# Schema changes made after the tables were first created.
+# create_all() skips tables that already exist, so these are applied on every startup
+# and must be idempotent (IF NOT EXISTS).
+SCHEMA_UPDATES = {
+    # Unique (project_id, lead) on merged_results - needed for fast lead lookups and ON CONFLICT merges
+    "ix_merged_results_project_lead":
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_merged_results_project_lead ON merged_results (project_id, lead)",
+    # Normalized lead columns read by the merges
+    "ix_serp_leads_aggregated_project_leads":
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_serp_leads_aggregated_project_leads ON serp_leads_aggregated (project_id, leads)",
+    "ix_datasets_project_dataset_lead":
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_datasets_project_dataset_lead ON datasets (project_dataset_id, lead)",
+}
+
+# Cleanup that must run before an index in SCHEMA_UPDATES can be built (only while the index doesn't exist).
+# Merges before the unique index could store the same lead twice per project - keep the oldest row
+SCHEMA_UPDATE_CLEANUPS = {
+    "ix_merged_results_project_lead": """
+        DELETE FROM merged_results newer
+        USING merged_results older
+        WHERE newer.project_id = older.project_id
+        AND newer.lead = older.lead
+        AND newer.id > older.id
+    """,
+}
+
 class DatabaseService:
     def __init__(self):
         """Initialize database service with connection to the main database"""
@@ -26,10 +52,13 @@ class DatabaseService:
         )
         # This creates the connection pool (default to 5 connections in the pool)
         # Think of it like parking spaces how many sessions we can create
-        self.engine = create_engine(self.connection_string)
+        # query_cache_size: room for every compiled statement the services reuse (default is 500)
+        self.engine = create_engine(self.connection_string, query_cache_size=1200)
         # this is the factory for creating new sessions
         # this attachs the get_sessions with the connection pool
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        # expire_on_commit=False keeps objects readable after commit (and after the session closes)
+        # without an extra SELECT to reload values we just wrote
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=self.engine)
         
     def get_session(self) -> Session:
         """Get database session - this creates new session
@@ -119,6 +148,7 @@ class DatabaseService:
             # Check if all tables already exist - if yes, skip creation
             if self.check_all_tables_exist():
                 logger.info("✅ All required tables already exist - skipping creation")
+                self.apply_schema_updates()
                 return True
             
             # Only create tables if they don't exist
@@ -129,6 +159,7 @@ class DatabaseService:
             # Verify all tables were actually created
             if self.check_all_tables_exist():
                 logger.info("✅ All table creation verified")
+                self.apply_schema_updates()
                 return True
             else:
                 logger.error("❌ Table creation failed - some tables not found after creation")
@@ -141,6 +172,53 @@ class DatabaseService:
             logger.error(f"❌ Database setup failed: {e}")
             raise
 
+    def apply_schema_updates(self) -> None:
+        """
+        Apply SCHEMA_UPDATES to existing tables.
+        
+        Runs on an AUTOCOMMIT connection because CREATE INDEX CONCURRENTLY
+        cannot run inside a transaction block (and doesn't lock the table for writes).
+        A CONCURRENTLY build that failed part-way (e.g. duplicate leads blocking the unique
+        index) leaves an INVALID index behind that IF NOT EXISTS would skip forever,
+        so those are dropped first and rebuilt.
+        Indexes that don't exist yet run their SCHEMA_UPDATE_CLEANUPS first (e.g. removing
+        duplicate (project_id, lead) rows that would make the unique index build fail).
+        
+        Raises:
+            SQLAlchemyError: If an index still can't be built
+        """
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            invalid_indexes = connection.execute(text("""
+                SELECT c.relname
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE NOT i.indisvalid AND c.relname = ANY(:index_names)
+            """), {"index_names": list(SCHEMA_UPDATES)}).scalars().all()
+            
+            for index_name in invalid_indexes:
+                logger.warning(f"⚠️ Rebuilding invalid index {index_name}")
+                connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"'))
+            
+            existing_indexes = set(connection.execute(text("""
+                SELECT indexname FROM pg_indexes WHERE indexname = ANY(:index_names)
+            """), {"index_names": list(SCHEMA_UPDATES)}).scalars().all())
+            
+            for index_name, statement in SCHEMA_UPDATES.items():
+                if index_name in existing_indexes:
+                    continue
+                
+                if index_name in SCHEMA_UPDATE_CLEANUPS:
+                    removed_rows = connection.execute(text(SCHEMA_UPDATE_CLEANUPS[index_name])).rowcount
+                    if removed_rows:
+                        logger.warning(f"⚠️ Removed {removed_rows} row(s) that would block index {index_name}")
+                
+                try:
+                    connection.execute(text(statement))
+                except SQLAlchemyError as e:
+                    logger.error(f"❌ Could not build index {index_name} - queries relying on it will fail: {e}")
+                    raise
+        logger.info(f"✅ Applied {len(SCHEMA_UPDATES)} schema update(s)")
+
     def export_table_as_csv(self, table_name: str | list[str]):
         """
         Export any table to CSV file
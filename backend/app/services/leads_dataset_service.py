@@ -6,18 +6,36 @@ import pandas as pd
 import csv
 import re
 import json
-from io import BytesIO, StringIO
+from io import StringIO
+from typing import BinaryIO
 from datetime import datetime
+from sqlalchemy import insert
 from sqlalchemy.exc import SQLAlchemyError
 
 from .database_service import db_service
 from .project_service import project_service
-from ..models.tables import ProjectDataset, Dataset, Project
+from ..models.tables import ProjectDataset, Dataset
 from .merged_results_service import merged_results_service
 from ..utils.lead_utils import normalize_lead_name, sanitize_value
 
 logger = logging.getLogger(__name__)
 
+# Rows parsed (and inserted) per chunk when uploading a dataset
+DATASET_CHUNK_ROWS = 10_000
+
+def _iter_csv_chunks(csv_file: BinaryIO):
+    """
+    Yield DataFrame chunks of DATASET_CHUNK_ROWS rows, re-raising parse errors as ValueError.
+    Values are read as strings - type inference per chunk could otherwise turn the same column into
+    int in one chunk and float in another (e.g. "1" vs "1.0"); blanks stay NaN
+    """
+    try:
+        yield from pd.read_csv(
+            csv_file, encoding='utf-8', encoding_errors='replace', dtype=str, chunksize=DATASET_CHUNK_ROWS
+        )
+    except Exception as e:
+        raise ValueError(f"Failed to parse CSV file: {str(e)}")
+
 
 class LeadsDatasetService:
     """Service for managing dataset uploads and processing"""
@@ -29,7 +47,7 @@ class LeadsDatasetService:
         lead_column: str,
         enrichment_column_list: list[str],  # Always a list (empty if no enrichment columns)
         enrichment_column_exists: bool,
-        csv_content: bytes  # CSV file as bytes
+        csv_file: BinaryIO  # CSV file object (read in place, not copied into memory)
     ) -> dict:
         """
         Upload and process a CSV dataset.
@@ -40,7 +58,7 @@ class LeadsDatasetService:
             lead_column: Name of column containing leads (company names)
             enrichment_column_list: Name of column(s) for enrichment values in list
             enrichment_column_exists: Whether the enrichment column exists in CSV
-            csv_content: CSV file content as bytes
+            csv_file: Binary file object with the CSV content, positioned at the start
             
         Returns:
             dict: Success status and statistics
@@ -48,25 +66,26 @@ class LeadsDatasetService:
         try:
             with db_service.get_session() as session:
                 # Validate project exists
-                project = session.query(Project).filter(Project.id == project_id).first()
-                if not project:
+                if not project_service.project_exists(project_id):
                     raise ValueError(f"Project {project_id} not found")
                 
-                # Parse CSV
-                # csv_content is always bytes from FastAPI UploadFile.read()
+                # Read just the header first to validate columns - the rows are then parsed in chunks
+                # below, so only DATASET_CHUNK_ROWS rows are held as a DataFrame at any time and
+                # memory stays flat however large the upload is
                 try:
-                    df = pd.read_csv(BytesIO(csv_content), encoding='utf-8', encoding_errors='replace')
+                    columns = pd.read_csv(csv_file, nrows=0, encoding='utf-8', encoding_errors='replace').columns
+                    csv_file.seek(0)
                 except Exception as e:
                     raise ValueError(f"Failed to parse CSV file: {str(e)}")
                 
                 # Normalize column names (strip whitespace)
-                df.columns = df.columns.str.strip()
+                columns = columns.str.strip()
                 lead_column = lead_column.strip()
                 enrichment_column_list = [col.strip() for col in enrichment_column_list]
                 
                 # Validate lead_column exists
-                if lead_column not in df.columns:
-                    raise ValueError(f"Lead column '{lead_column}' not found in CSV. Available columns: {', '.join(df.columns)}")
+                if lead_column not in columns:
+                    raise ValueError(f"Lead column '{lead_column}' not found in CSV. Available columns: {', '.join(columns)}")
                 
                 # Handle enrichment columns (can be single or multiple)
                 if enrichment_column_exists:
@@ -74,11 +93,11 @@ class LeadsDatasetService:
                     if len(enrichment_column_list) == 0:
                         raise ValueError("enrichment_column_list cannot be empty when enrichment_column_exists is True")
                     
-                    missing_columns = [col for col in enrichment_column_list if col not in df.columns]
+                    missing_columns = [col for col in enrichment_column_list if col not in columns]
                     if missing_columns:
                         raise ValueError(
                             f"Enrichment column(s) not found in CSV: {', '.join(missing_columns)}. "
-                            f"Available columns: {', '.join(df.columns)}"
+                            f"Available columns: {', '.join(columns)}"
                         )
     
                     enrichment_column_for_merge = enrichment_column_list
@@ -89,29 +108,6 @@ class LeadsDatasetService:
                     enrichment_column_for_merge = [f"{safe_dataset_name}_exists"]
                     logger.info(f"Creating column '{safe_dataset_name}_exists' with value True")
                 
-                # Check for duplicate leads in the CSV (case-insensitive, whitespace-trimmed)
-                lead_values = df[lead_column].astype(str).str.strip()
-                # Remove empty/NaN values for duplicate check
-                non_empty_leads = lead_values[lead_values != ''].str.lower()
-                duplicates = non_empty_leads[non_empty_leads.duplicated(keep=False)]
-                
-                if not duplicates.empty:
-                    # Get unique duplicate lead names (original case from first occurrence)
-                    duplicate_leads = []
-                    seen_lower = set()
-                    for idx, lead_lower in duplicates.items():
-                        if lead_lower not in seen_lower:
-                            seen_lower.add(lead_lower)
-                            # Get original case from dataframe
-                            original_lead = str(df.loc[idx, lead_column]).strip()
-                            duplicate_leads.append(original_lead)
-                    
-                    raise ValueError(
-                        f"Duplicate leads found in CSV. Each lead must be unique. "
-                        f"Found duplicates: {', '.join(duplicate_leads[:10])}"
-                        f"{'...' if len(duplicate_leads) > 10 else ''}"
-                    )
-                
                 # Create ProjectDataset record
                 project_dataset = ProjectDataset(
                     project_id=project_id,
@@ -123,51 +119,86 @@ class LeadsDatasetService:
                 session.add(project_dataset)
                 session.flush()  # Get the ID without committing yet
                 
-                # Process rows
+                # Duplicate check across all chunks (case-insensitive, whitespace-trimmed):
+                # first spelling seen per lowercased lead, and the duplicated ones in order found
+                seen_leads = {}
+                duplicate_leads = {}
                 rows_processed = 0
                 
-                for idx, row in df.iterrows():
-                    try:
-                        # Get lead value and normalize it (lowercase, trim whitespace, etc.)
-                        lead_value = str(row[lead_column]).strip()
-                        if not lead_value or pd.isna(row[lead_column]):
-                            logger.warning(f"Skipping row {idx}: empty lead value")
-                            continue
-                        
-                        # Normalize lead name before saving (lowercase, trim whitespace)
-                        normalized_lead = normalize_lead_name(lead_value)
-                        
-                        # Skip empty leads after normalization
-                        if not normalized_lead:
-                            logger.warning(f"Skipping row {idx}: lead became empty after normalization")
-                            continue
-                        
-                        # Get enrichment value(s)
-                        if enrichment_column_exists and len(enrichment_column_list) > 0:
-                            # Multiple or single enrichment columns from CSV
-                            if len(enrichment_column_list) == 1:
-                                # Single column - store value directly
-                                enrichment_value = str(row[enrichment_column_list[0]])
-                            else:
-                                # Multiple columns - store as JSON object
-                                enrichment_dict = {col: str(row[col]) for col in enrichment_column_list}
-                                enrichment_value = json.dumps(enrichment_dict)
+                for chunk in _iter_csv_chunks(csv_file):
+                    chunk.columns = chunk.columns.str.strip()
+                    
+                    # Check for duplicate leads in the CSV (empty values are not duplicates)
+                    lead_values = chunk[lead_column].astype(str).str.strip()
+                    for lead_value in lead_values[lead_values != '']:
+                        lead_lower = lead_value.lower()
+                        if lead_lower in seen_leads:
+                            duplicate_leads.setdefault(lead_lower, seen_leads[lead_lower])
                         else:
-                            # Column doesn't exist (for col {safe_dataset_name}_exists) - set to True
-                            enrichment_value = "true"
-                        
-                        # Create Dataset record with normalized lead
-                        dataset_row = Dataset(
-                            project_dataset_id=project_dataset.id,
-                            lead=normalized_lead,  # Store normalized version
-                            enrichment_value=enrichment_value
-                        )
-                        session.add(dataset_row)
-                        rows_processed += 1
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing row {idx}: {e}")
+                            seen_leads[lead_lower] = lead_value
+                    
+                    # Once a duplicate is found nothing will be committed - keep scanning only to report them all
+                    if duplicate_leads:
                         continue
+                    
+                    # Process rows - collected and inserted in one executemany per chunk rather than
+                    # adding an ORM object per row
+                    dataset_rows = []
+                    
+                    for idx, row in chunk.iterrows():
+                        try:
+                            # Get lead value and normalize it (lowercase, trim whitespace, etc.)
+                            lead_value = str(row[lead_column]).strip()
+                            if not lead_value or pd.isna(row[lead_column]):
+                                logger.warning(f"Skipping row {idx}: empty lead value")
+                                continue
+                            
+                            # Normalize lead name before saving (lowercase, trim whitespace)
+                            normalized_lead = normalize_lead_name(lead_value)
+                            
+                            # Skip empty leads after normalization
+                            if not normalized_lead:
+                                logger.warning(f"Skipping row {idx}: lead became empty after normalization")
+                                continue
+                            
+                            # Get enrichment value(s)
+                            if enrichment_column_exists and len(enrichment_column_list) > 0:
+                                # Multiple or single enrichment columns from CSV
+                                if len(enrichment_column_list) == 1:
+                                    # Single column - store value directly
+                                    enrichment_value = str(row[enrichment_column_list[0]])
+                                else:
+                                    # Multiple columns - store as JSON object
+                                    enrichment_dict = {col: str(row[col]) for col in enrichment_column_list}
+                                    enrichment_value = json.dumps(enrichment_dict)
+                            else:
+                                # Column doesn't exist (for col {safe_dataset_name}_exists) - set to True
+                                enrichment_value = "true"
+                            
+                            # Create Dataset row with normalized lead
+                            dataset_rows.append({
+                                "project_dataset_id": project_dataset.id,
+                                "lead": normalized_lead,  # Store normalized version
+                                "enrichment_value": enrichment_value
+                            })
+                            
+                        except Exception as e:
+                            logger.error(f"Error processing row {idx}: {e}")
+                            continue
+                    
+                    # Insert the chunk's rows in one batched statement (psycopg2 "insertmanyvalues" batching)
+                    if dataset_rows:
+                        session.execute(insert(Dataset), dataset_rows)
+                    rows_processed += len(dataset_rows)
+                
+                if duplicate_leads:
+                    # Raising before commit discards the ProjectDataset and any rows already inserted
+                    duplicate_leads = list(duplicate_leads.values())
+                    raise ValueError(
+                        f"Duplicate leads found in CSV. Each lead must be unique. "
+                        f"Found duplicates: {', '.join(duplicate_leads[:10])}"
+                        f"{'...' if len(duplicate_leads) > 10 else ''}"
+                    )
                 
                 # Update row count
                 project_dataset.row_count = rows_processed
@@ -5,30 +5,58 @@ Lead generation from search using AI-powered query generation
 import os
 import logging
 import asyncio
+import time
 from openai import OpenAI
 import csv
-from io import StringIO, BytesIO
+from io import BytesIO, TextIOWrapper
 from datetime import datetime
 import re
 import zipfile
+from typing import Callable
 from agents import Agent, Runner, function_tool,set_default_openai_key
 from pydantic import BaseModel
 from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy import func, distinct
+from sqlalchemy import func, distinct, select, update
 
 from .database_service import db_service
 from .project_service import project_service
 from .merged_results_service import merged_results_service
 
-from ..utils.scrapers import jina_serp_scraper, jina_url_scraper
-from ..utils.lead_utils import normalize_lead_name
+from ..utils.scrapers import jina_serp_scraper_async, jina_url_scraper_async
+from ..utils.lead_utils import normalize_lead_name, normalize_query
 from ..config import settings
 from ..prompts import SERP_QUERIES_PROMPT, SERP_EXTRACTION_PROMPT
-from ..models.tables import SerpQuery, SerpUrl, SerpLead, SerpLeadAggregated, Project
+from ..models.tables import SerpQuery, SerpUrl, SerpLead, SerpLeadAggregated
 from ..models.schemas import QueryListRequest
 
 logger = logging.getLogger(__name__)
 
+# Upsert for search result URLs, built once so SQLAlchemy's compiled-statement cache is hit
+# on every call - rows are passed as executemany parameters instead of being baked into the SQL
+_url_insert = insert(SerpUrl)
+URL_UPSERT = _url_insert.on_conflict_do_update(
+    index_elements=['link'],
+    set_=dict(
+        title=_url_insert.excluded.title,
+        snippet=_url_insert.excluded.snippet
+    ),
+    # Only rewrite rows whose title/snippet actually changed - re-running the same
+    # query otherwise creates a new row version (and WAL) for every existing link
+    where=(
+        SerpUrl.title.is_distinct_from(_url_insert.excluded.title)
+        | SerpUrl.snippet.is_distinct_from(_url_insert.excluded.snippet)
+    )
+)
+
+# Characters stripped from project names when building download filenames
+FILENAME_UNSAFE_PATTERN = re.compile(r'[^\w\s-]')
+
+# Max Jina SERP searches in flight at once when generating URLs
+SERP_CONCURRENCY = 5
+# Finished extraction jobs stay readable this long (or until the next run starts), so a retried
+# poll or a second browser tab still sees the outcome
+EXTRACTION_JOB_TTL_SECONDS = 10 * 60
+
 # Disable noisy third-party logs
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("openai").setLevel(logging.WARNING)
@@ -45,6 +73,18 @@ class LeadsSerpService:
 
         # for openai agents sdk
         set_default_openai_key(settings.openai_api_key)
+        
+        # Lead extraction agent, built once and reused for every URL
+        # (no tools - the URL is always scraped first and passed in the input)
+        self._lead_extraction_agent = Agent(
+            name="Lead Generator",
+            instructions=SERP_EXTRACTION_PROMPT,
+            tools=[],
+            output_type=list[str], # Specify the output type as a list of strings
+        )
+        
+        # Background lead extraction runs, one per project (see start_extraction_job)
+        self._extraction_jobs: dict[int, dict] = {}
 
     def _generate_search_queries(self, query_search_target: str, num_queries: int = 3) -> list[str]:
         """
@@ -146,46 +186,47 @@ class LeadsSerpService:
                 raise ValueError(f"Project with ID {project_id} does not exist. Please create the project first.")
             raise
 
-    def _generate_and_add_urls_to_table(self, project_id: int, queries: list[str]) -> dict:
+    async def _generate_and_add_urls_to_table(self, project_id: int, queries: list[str]) -> dict:
         """
-        1. first generate the urls using jina_serp_scraper
+        1. first generate the urls using jina_serp_scraper_async (all queries concurrently)
         2. then save urls to serp_urls table
         
         Returns:
             dict: Contains success status, URLs added, and statistics
         """
         try:
+            # STEP 1: Run all searches concurrently - each is a network round trip, so N queries take
+            # about as long as the slowest one. Bounded so we stay within Jina's rate limits.
+            # Done before opening the session so no DB connection is held while waiting on the network
+            semaphore = asyncio.Semaphore(SERP_CONCURRENCY)
+            
+            async def _search(query: str) -> list[dict]:
+                async with semaphore:
+                    return await jina_serp_scraper_async(query)
+            
+            serp_objects = await asyncio.gather(*(_search(query) for query in queries))
+            
             with db_service.get_session() as session:
-                # STEP 1: Collect all generated urls first using jina_serp_scraper
-                all_urls = []
-                seen_links = set()  # Track unique links to avoid duplicates
+                # Collect all generated urls, keyed by link - one upsert statement can't affect the
+                # same link twice (Postgres raises CardinalityViolation), so keep the first result per link
+                urls_by_link = {}
                 
-                for query in queries:
-                    # extract the urls using Serpapi
-                    serp_object = jina_serp_scraper(query)
+                for query, serp_object in zip(queries, serp_objects):
                     for serp_result in serp_object:
                         link = serp_result.get('url')
-                        # Only add if we haven't seen this link before in this batch
-                        if link and link not in seen_links:
-                            seen_links.add(link)
-                            all_urls.append({
+                        if link and link not in urls_by_link:
+                            urls_by_link[link] = {
                                 'project_id': project_id,
                                 'query': query,
                                 'title': serp_result.get('title'),
                                 'link': link,
                                 'snippet': serp_result.get('description')
-                            })
+                            }
+                all_urls = list(urls_by_link.values())
 
                 # Step 2: Batch upsert using SQLAlchemy core
-                statement = insert(SerpUrl).values(all_urls)
-                statement = statement.on_conflict_do_update(
-                    index_elements=['link'],
-                    set_=dict(
-                        title=statement.excluded.title,
-                        snippet=statement.excluded.snippet
-                    )
-                )
-                session.execute(statement)
+                if all_urls:
+                    session.execute(URL_UPSERT, all_urls)
                 session.commit()
                 logger.info(f"✅ Processed {len(all_urls)} URLs for {len(queries)} queries")
             
@@ -203,7 +244,7 @@ class LeadsSerpService:
                 raise ValueError(f"Project with ID {project_id} does not exist. Please create the project first.")
             raise
 
-    def save_queries_and_generate_urls(self, project_id: int, queries: list[str]) -> dict:
+    async def save_queries_and_generate_urls(self, project_id: int, queries: list[str]) -> dict:
         """
         Orchestrates saving queries and generating URLs in one operation.
         This is the main business workflow that should be used by API routes.
@@ -222,11 +263,23 @@ class LeadsSerpService:
         Raises:
             ValueError: If project does not exist or validation fails
         """
+        # Drop blank and repeated queries (see normalize_query) so the same search is
+        # never sent to Jina twice - keeps the first spelling of each. This is the single
+        # dedupe rule for queries; the frontend sends its list as-is
+        unique_queries = {}
+        for query in queries:
+            query_key = normalize_query(query)
+            if query_key:
+                unique_queries.setdefault(query_key, query.strip())
+        if len(unique_queries) < len(queries):
+            logger.info(f"⏭️ Skipping {len(queries) - len(unique_queries)} blank/duplicate queries")
+        queries = list(unique_queries.values())
+        
         # Step 1: Save queries to database
         queries_saved = self._add_queries_to_table(project_id, queries)
         
         # Step 2: Generate URLs from queries and save to database
-        urls_result = self._generate_and_add_urls_to_table(project_id, queries)
+        urls_result = await self._generate_and_add_urls_to_table(project_id, queries)
         
         # Combine results into unified response
         return {
@@ -315,6 +368,8 @@ class LeadsSerpService:
                 session.add(new_url)
                 session.commit()
                 session.refresh(new_url)
+                # URL counts are part of the cached project
+                project_service.invalidate_project_cache(project_id)
                 
                 logger.info(f"Created URL {new_url.id} for project {project_id}")
                 
@@ -373,6 +428,8 @@ class LeadsSerpService:
                     url.link = link
                 
                 session.commit()
+                # URL counts are part of the cached project
+                project_service.invalidate_project_cache(project_id)
                 
                 logger.info(f"Updated URL {url_id} for project {project_id}")
                 
@@ -411,13 +468,9 @@ class LeadsSerpService:
         """
         try:
             with db_service.get_session() as session:
-                # Debug: Check if URL exists at all (any project)
-                url_any_project = session.query(SerpUrl).filter(SerpUrl.id == url_id).first()
-                # Debug: Check if URL exists for this project
-                url = session.query(SerpUrl).filter(
-                    SerpUrl.id == url_id,
-                    SerpUrl.project_id == project_id
-                ).first()
+                # Primary-key lookup (identity map first), then check it belongs to this project
+                url_any_project = session.get(SerpUrl, url_id)
+                url = url_any_project if url_any_project and url_any_project.project_id == project_id else None
                 
                 if not url:
                     # Enhanced error message with debug info
@@ -436,6 +489,8 @@ class LeadsSerpService:
                 
                 session.delete(url)
                 session.commit()
+                # URL counts are part of the cached project
+                project_service.invalidate_project_cache(project_id)
                 
                 logger.info(f"Deleted URL {url_id} for project {project_id}")
                 
@@ -456,15 +511,7 @@ class LeadsSerpService:
         """
         # Always scrape the URL first
         logger.info(f"Scraping URL: {url}")
-        scraped_content = jina_url_scraper(url)
-        
-        # Create agent without tools (no tool calls needed)
-        agent = Agent(
-            name="Lead Generator",
-            instructions=SERP_EXTRACTION_PROMPT,
-            tools=[],  # No tools - we always scrape first
-            output_type=list[str], # Specify the output type as a list of strings
-        )
+        scraped_content = await jina_url_scraper_async(url)
         
         # Build input with scraped content included
         input_text = f"""
@@ -479,14 +526,18 @@ Scraped Content:
 """
         
         # Run the agent with scraped content already in the input
-        result = await Runner.run(agent, input=input_text)
+        result = await Runner.run(self._lead_extraction_agent, input=input_text)
         
         logger.info(f"Final output (company names): {result.final_output}")
         # enforce list type for leads
         leads = result.final_output
         return leads, scraped_content
     
-    async def extract_and_add_leads_to_table(self, project_id: int) -> dict:
+    async def extract_and_add_leads_to_table(
+        self,
+        project_id: int,
+        progress_callback: Callable[[dict], None] | None = None
+    ) -> dict:
         """
         Process unprocessed URLs from serp_urls table:
         1. Get all URLs with status="unprocessed" for the project
@@ -497,13 +548,29 @@ Scraped Content:
            - "skip" if no leads found (empty list)
            - "failed" if extraction or saving failed
         5. Save extracted leads to serp_leads table
+        
+        Args:
+            project_id: Project ID to extract leads for
+            progress_callback: Optional callable, called with a progress event dict
+                ({"event": "progress", "url", "completed", "total", "leads_found", "failed"})
+                as each URL's extraction finishes
         """
         try:
             with db_service.get_session() as session:
                 # Step 1: Get all unprocessed URLs for this project (only unprocessed, not failed)
-                unprocessed_urls = session.query(SerpUrl).filter(
-                    SerpUrl.project_id == project_id,
-                    SerpUrl.status == "unprocessed"
+                # Only the columns extraction reads, as plain rows (no ORM instances / change tracking);
+                # website_scraped is only written here, so it is never loaded
+                unprocessed_urls = session.execute(
+                    select(
+                        SerpUrl.id,
+                        SerpUrl.query,
+                        SerpUrl.title,
+                        SerpUrl.snippet,
+                        SerpUrl.link
+                    ).where(
+                        SerpUrl.project_id == project_id,
+                        SerpUrl.status == "unprocessed"
+                    )
                 ).all()
                 
                 if not unprocessed_urls:
@@ -526,15 +593,35 @@ Scraped Content:
                 failed_count = 0
                 new_leads_count = 0
                 all_extracted_leads = []  # Collect all results to return in response
+                # New status/website_scraped per URL id and new serp_leads rows - both written
+                # in single bulk statements at the end
+                status_updates = {}
+                lead_rows = []
                 
-                # Step 2: Process each URL
-                for url_record in unprocessed_urls:
-                    try:
+                # Step 2: Extract leads from all URLs concurrently - each extraction is network-bound
+                # (Jina scrape + LLM), bounded by a semaphore so we don't flood the APIs.
+                # Results are processed one by one afterwards, so counters and row lists need no locking
+                semaphore = asyncio.Semaphore(settings.extraction_concurrency)
+                completed_count = 0
+                
+                def _report_progress(url_record, leads, extract_error) -> None:
+                    nonlocal completed_count
+                    completed_count += 1
+                    if progress_callback is not None:
+                        progress_callback({
+                            "event": "progress",
+                            "url": url_record.link,
+                            "completed": completed_count,
+                            "total": len(unprocessed_urls),
+                            # Raw count from the LLM, before cleaning and normalization
+                            "leads_found": len(leads) if isinstance(leads, list) else 0,
+                            "failed": extract_error is not None
+                        })
+                
+                async def _extract(url_record) -> tuple[list, str | None, Exception | None]:
+                    async with semaphore:
                         logger.info(f"Processing URL: {url_record.link}")
-                        
-                        # Extract leads using the _lead_extractor method
-                        leads = []
-                        scraped_content = None
+                        leads, scraped_content, extract_error = [], None, None
                         try:
                             leads, scraped_content = await self._lead_extractor(
                                 query=url_record.query,
@@ -542,11 +629,21 @@ Scraped Content:
                                 snippet=url_record.snippet,
                                 url=url_record.link
                             )
-                        except Exception as extract_error:
+                        except Exception as e:
+                            extract_error = e
+                        _report_progress(url_record, leads, extract_error)
+                        return leads, scraped_content, extract_error
+                
+                extraction_results = await asyncio.gather(
+                    *(_extract(url_record) for url_record in unprocessed_urls)
+                )
+                
+                for url_record, (leads, scraped_content, extract_error) in zip(unprocessed_urls, extraction_results):
+                    try:
+                        if extract_error is not None:
                             # Extraction failed - log but continue processing
                             logger.error(f"❌ Extraction error for {url_record.link}: {str(extract_error)}")
-                            url_record.status = "failed"
-                            url_record.website_scraped = None
+                            status_updates[url_record.id] = {"id": url_record.id, "status": "failed", "website_scraped": None}
                             failed_count += 1
                             
                             # Add failed URL to results
@@ -577,44 +674,41 @@ Scraped Content:
                             leads = cleaned_leads
                             logger.info(f"Cleaned leads: {leads}")
                         
-                        # Step 3: Update the URL record
-                        url_record.website_scraped = scraped_content
-                        
-                        # Step 4: Determine status based on results
+                        # Step 3: Determine status based on results
                         if leads and isinstance(leads, list) and len(leads) > 0:
                             # Leads found - mark as processed
-                            url_record.status = "processed"
+                            status = "processed"
                             processed_count += 1
                             
-                            # Step 5: Save leads to serp_leads table (normalized)
+                            # Step 4: Queue leads for the serp_leads table (normalized)
                             try:
-                                for lead in leads:
-                                    # Normalize lead name before saving (lowercase, trim whitespace)
-                                    normalized_lead = normalize_lead_name(lead)
-                                    
-                                    # Skip empty leads after normalization
-                                    if not normalized_lead:
-                                        continue
-                                    
-                                    lead_record = SerpLead(
-                                        project_id=project_id,
-                                        serp_url_id=url_record.id,
-                                        lead=normalized_lead  # Store normalized version
-                                    )
-                                    session.add(lead_record)
-                                    new_leads_count += 1
+                                # Normalize each lead name once before saving (lowercase, trim whitespace).
+                                # The stored value is what aggregation and merging compare against, so it is
+                                # never normalized again downstream; duplicates within one URL collapse here
+                                normalized_leads = dict.fromkeys(normalize_lead_name(lead) for lead in leads)
+                                url_lead_rows = [
+                                    {
+                                        "project_id": project_id,
+                                        "serp_url_id": url_record.id,
+                                        "lead": normalized_lead  # Store normalized version
+                                    }
+                                    for normalized_lead in normalized_leads
+                                    if normalized_lead  # Skip empty leads after normalization
+                                ]
+                                lead_rows.extend(url_lead_rows)
+                                new_leads_count += len(url_lead_rows)
                                 
                                 logger.info(f"✅ Extracted {len(leads)} leads from {url_record.link}")
                             except Exception as save_error:
                                 # Failed to save leads - log but continue
                                 logger.error(f"❌ Failed to save leads for {url_record.link}: {str(save_error)}")
-                                url_record.status = "failed"
+                                status_updates[url_record.id] = {"id": url_record.id, "status": "failed", "website_scraped": scraped_content}
                                 failed_count += 1
                                 continue
                             
                         else:
                             # No leads found - mark as skip
-                            url_record.status = "skip"
+                            status = "skip"
                             skipped_count += 1
                             logger.info(f"⏭️ No leads found in {url_record.link} - marked as skip")
                         
@@ -624,16 +718,18 @@ Scraped Content:
                             "title": url_record.title,
                             "query": url_record.query,
                             "snippet": url_record.snippet,
-                            "status": url_record.status,
-                            "website_scraped": url_record.website_scraped,
+                            "status": status,
+                            "website_scraped": scraped_content,
                             "leads": leads if leads else []
                         })
+                        
+                        # Step 5: Update the URL record
+                        status_updates[url_record.id] = {"id": url_record.id, "status": status, "website_scraped": scraped_content}
                             
                     except Exception as e:
                         # Unexpected error - mark as failed and continue processing
                         logger.error(f"❌ Unexpected error processing {url_record.link}: {str(e)}")
-                        url_record.status = "failed"
-                        url_record.website_scraped = None
+                        status_updates[url_record.id] = {"id": url_record.id, "status": "failed", "website_scraped": None}
                         failed_count += 1
                         
                         # Add failed URL to results
@@ -648,7 +744,11 @@ Scraped Content:
                         })
                         # Continue to next URL - don't let one failure stop the whole process
                 
-                # Commit all changes
+                # Save all leads and URL status/website_scraped updates in bulk, then commit
+                if lead_rows:
+                    session.execute(insert(SerpLead), lead_rows)
+                if status_updates:
+                    session.execute(update(SerpUrl), list(status_updates.values()))
                 session.commit()
                 
                 logger.info(f"✅ Lead extraction completed for project {project_id}:")
@@ -694,6 +794,97 @@ Scraped Content:
                 raise ValueError(f"Project with ID {project_id} does not exist. Please create the project first.")
             raise
     
+    def _job_status(self, job: dict) -> dict:
+        """Public view of an extraction job (everything except the asyncio task and finish time)"""
+        return {key: value for key, value in job.items() if key not in ("task", "finished_at")}
+    
+    def _prune_finished_jobs(self) -> None:
+        """Forget finished jobs older than EXTRACTION_JOB_TTL_SECONDS - their results include scraped pages"""
+        expired_before = time.monotonic() - EXTRACTION_JOB_TTL_SECONDS
+        for project_id, job in list(self._extraction_jobs.items()):
+            if job["status"] != "running" and job["finished_at"] < expired_before:
+                del self._extraction_jobs[project_id]
+    
+    def start_extraction_job(self, project_id: int) -> dict:
+        """
+        Start extract_and_add_leads_to_table in the background, so the caller doesn't have to
+        hold a request open for the whole run. Must be called from the event loop.
+        If a run is already in progress for the project, that run is returned instead.
+        
+        Args:
+            project_id: Project ID to extract leads for
+            
+        Returns:
+            dict: Job status - status ("running", "done" or "failed"), completed, total,
+                leads_found, failed, result (extract_and_add_leads_to_table output when done)
+                and detail (error message when failed)
+            
+        Raises:
+            ValueError: If project with project_id does not exist
+        """
+        self._prune_finished_jobs()
+        job = self._extraction_jobs.get(project_id)
+        if job and job["status"] == "running":
+            return self._job_status(job)
+        
+        if not project_service.project_exists(project_id):
+            raise ValueError(f"Project {project_id} not found")
+        
+        job = {
+            "status": "running",
+            "completed": 0,
+            "total": 0,
+            "leads_found": 0,
+            "failed": 0,
+            "result": None,
+            "detail": None,
+            "finished_at": None
+        }
+        
+        def _on_progress(event: dict) -> None:
+            job["completed"] = event["completed"]
+            job["total"] = event["total"]
+            job["leads_found"] += event["leads_found"]
+            job["failed"] += int(event["failed"])
+        
+        async def _run() -> None:
+            try:
+                job["result"] = await self.extract_and_add_leads_to_table(project_id, progress_callback=_on_progress)
+                job["status"] = "done"
+            except Exception as e:
+                logger.error(f"❌ Lead extraction job failed for project {project_id}: {str(e)}")
+                job["status"] = "failed"
+                job["detail"] = str(e)
+            finally:
+                job["finished_at"] = time.monotonic()
+        
+        # Keep a reference to the task so it isn't garbage collected while running
+        job["task"] = asyncio.create_task(_run())
+        self._extraction_jobs[project_id] = job
+        logger.info(f"Started lead extraction job for project {project_id}")
+        return self._job_status(job)
+    
+    def get_extraction_job(self, project_id: int) -> dict:
+        """
+        Get the status of the project's lead extraction job.
+        A finished job can be read repeatedly until the next run starts or
+        EXTRACTION_JOB_TTL_SECONDS pass.
+        
+        Args:
+            project_id: Project ID the job was started for
+            
+        Returns:
+            dict: Job status (same shape as start_extraction_job)
+            
+        Raises:
+            ValueError: If there is no extraction job for the project
+        """
+        self._prune_finished_jobs()
+        job = self._extraction_jobs.get(project_id)
+        if job is None:
+            raise ValueError(f"No lead extraction job found for project {project_id}")
+        return self._job_status(job)
+    
     
     def _transform_leads_to_aggregated(self, project_id: int) -> dict:
         """
@@ -710,8 +901,7 @@ Scraped Content:
         try:
             with db_service.get_session() as session:
                 # Validate project exists
-                project = session.query(Project).filter(Project.id == project_id).first()
-                if not project:
+                if not project_service.project_exists(project_id):
                     raise ValueError(f"Project {project_id} not found")
                 
                 # Query all SerpLead records for this project and group by lead name
@@ -738,16 +928,17 @@ Scraped Content:
                     SerpLeadAggregated.project_id == project_id
                 ).delete()
                 
-                # Insert fresh aggregated leads
-                leads_aggregated_count = 0
-                for lead_name, serp_count in aggregated_data:
-                    aggregated_lead = SerpLeadAggregated(
-                        project_id=project_id,
-                        leads=lead_name,  # Already normalized (lowercase)
-                        serp_count=serp_count
-                    )
-                    session.add(aggregated_lead)
-                    leads_aggregated_count += 1
+                # Insert fresh aggregated leads in a single executemany (no ORM object per lead)
+                aggregated_rows = [
+                    {
+                        "project_id": project_id,
+                        "leads": lead_name,  # Already normalized (lowercase)
+                        "serp_count": serp_count
+                    }
+                    for lead_name, serp_count in aggregated_data
+                ]
+                session.execute(insert(SerpLeadAggregated), aggregated_rows)
+                leads_aggregated_count = len(aggregated_rows)
                 
                 session.commit()
                 
@@ -766,108 +957,143 @@ Scraped Content:
             logger.error(f"❌ Error transforming leads to aggregated format: {str(e)}")
             raise Exception(f"Error transforming leads: {str(e)}")
     
-    def _export_all_data_as_csv(self, project_id: int) -> dict:
+    def _write_csv_to_zip(self, zip_file: zipfile.ZipFile, filename: str, header: list[str], rows) -> bool:
         """
-        Export ALL data as CSV(s) for all tables (queries, URLs, leads, leads_aggregated) for the project.
-        No filtering - just returns everything.
+        Stream CSV rows straight into a file inside the ZIP archive (no intermediate string buffer).
+        The file is only created if there is at least one row.
+        
+        Args:
+            zip_file: Open ZIP archive to write into
+            filename: Name of the CSV file inside the archive
+            header: CSV header row
+            rows: Iterable of CSV rows (lists of values)
+        
+        Returns:
+            bool: True if the file was written, False if there were no rows
+        """
+        rows = iter(rows)
+        first_row = next(rows, None)
+        if first_row is None:
+            return False
+        
+        with zip_file.open(filename, "w", force_zip64=True) as raw_file:
+            # Encode CSV with UTF-8 BOM for Excel compatibility
+            with TextIOWrapper(raw_file, encoding="utf-8-sig", newline="") as text_file:
+                writer = csv.writer(text_file)
+                writer.writerow(header)
+                writer.writerow(first_row)
+                writer.writerows(rows)
+        return True
+
+    def _write_all_data_to_zip(self, project_id: int, zip_file: zipfile.ZipFile) -> int:
+        """
+        Export ALL data as CSV(s) for all tables (queries, URLs, leads, leads_aggregated) for the project
+        into the given ZIP archive. No filtering - just writes everything.
+        Rows are streamed from the database in batches, so memory stays flat on large projects.
         
         Args:
             project_id: Project ID
+            zip_file: Open ZIP archive to write the CSV files into
         
         Returns:
-            dict: Contains CSV content as strings for queries, urls, leads, and leads_aggregated
+            int: Number of CSV files written (tables with no rows are skipped)
         """
         try:
             with db_service.get_session() as session:
-                csv_files = {}
+                files_written = 0
                 
                 # Get all queries for this project
                 queries = session.query(SerpQuery).filter(
                     SerpQuery.project_id == project_id
-                ).all()
+                ).yield_per(1000)
                 
-                if queries:
-                    output = StringIO()
-                    writer = csv.writer(output)
-                    writer.writerow(["id", "project_id", "query", "date_added"])
-                    for record in queries:
-                        writer.writerow([
+                files_written += self._write_csv_to_zip(
+                    zip_file,
+                    "serp_queries.csv",
+                    ["id", "project_id", "query", "date_added"],
+                    (
+                        [
                             record.id,
                             record.project_id,
                             record.query,
                             record.date_added.isoformat()
-                        ])
-                    csv_files["queries"] = output.getvalue()
+                        ]
+                        for record in queries
+                    )
+                )
                 
                 # Get all URLs for this project
                 urls = session.query(SerpUrl).filter(
                     SerpUrl.project_id == project_id
-                ).all()
+                ).yield_per(1000)
                 
-                if urls:
-                    output = StringIO()
-                    writer = csv.writer(output)
-                    writer.writerow(["id", "project_id", "query", "title", "link", "snippet", "website_scraped", "status", "created_at"])
-                    for record in urls:
-                        # Truncate website_scraped to 32600 characters to prevent CSV cell overflow (Excel limit is 32767)
-                        website_scraped = record.website_scraped
-                        if website_scraped and len(website_scraped) > 32600:
-                            website_scraped = website_scraped[:32600]
-                        writer.writerow([
+                # Truncate website_scraped to 32600 characters to prevent CSV cell overflow (Excel limit is 32767)
+                files_written += self._write_csv_to_zip(
+                    zip_file,
+                    "serp_urls.csv",
+                    ["id", "project_id", "query", "title", "link", "snippet", "website_scraped", "status", "created_at"],
+                    (
+                        [
                             record.id,
                             record.project_id,
                             record.query,
                             record.title,
                             record.link,
                             record.snippet,
-                            website_scraped or "",
+                            (record.website_scraped or "")[:32600],
                             record.status,
                             record.created_at.isoformat()
-                        ])
-                    csv_files["urls"] = output.getvalue()
+                        ]
+                        for record in urls
+                    )
+                )
                 
                 # Get all leads for this project
                 leads = session.query(SerpLead).filter(
                     SerpLead.project_id == project_id
-                ).all()
+                ).yield_per(1000)
                 
-                if leads:
-                    output = StringIO()
-                    writer = csv.writer(output)
-                    writer.writerow(["id", "project_id", "serp_url_id", "lead", "created_at"])
-                    for record in leads:
-                        writer.writerow([
+                files_written += self._write_csv_to_zip(
+                    zip_file,
+                    "serp_leads.csv",
+                    ["id", "project_id", "serp_url_id", "lead", "created_at"],
+                    (
+                        [
                             record.id,
                             record.project_id,
                             record.serp_url_id,
                             record.lead,
                             record.created_at.isoformat()
-                        ])
-                    csv_files["leads"] = output.getvalue()
+                        ]
+                        for record in leads
+                    )
+                )
                 
                 # Get all aggregated leads for this project, sorted by serp_count descending
                 aggregated_leads = session.query(SerpLeadAggregated).filter(
                     SerpLeadAggregated.project_id == project_id
                 ).order_by(
                     SerpLeadAggregated.serp_count.desc()
-                ).all()
+                ).yield_per(1000)
                 
-                if aggregated_leads:
-                    output = StringIO()
-                    writer = csv.writer(output)
-                    writer.writerow(["id", "project_id", "leads", "serp_count", "created_at", "updated_at"])
-                    for record in aggregated_leads:
-                        writer.writerow([
+                files_written += self._write_csv_to_zip(
+                    zip_file,
+                    "serp_leads_aggregated.csv",
+                    ["id", "project_id", "leads", "serp_count", "created_at", "updated_at"],
+                    (
+                        [
                             record.id,
                             record.project_id,
                             record.leads,
                             record.serp_count,
                             record.created_at.isoformat(),
                             record.updated_at.isoformat() if record.updated_at else ""
-                        ])
-                    csv_files["leads_aggregated"] = output.getvalue()
+                        ]
+                        for record in aggregated_leads
+                    )
+                )
             
-            return {"csv_files": csv_files}
+            return files_written
                 
         except Exception as e:
             logger.error(f"❌ Error exporting data as CSV: {str(e)}")
@@ -892,16 +1118,18 @@ Scraped Content:
             ValueError: If no data found for project or project doesn't exist
         """
         try:
-            # Step 1: Get CSV data using private method
-            export_result = self._export_all_data_as_csv(project_id)
-            csv_files = export_result.get("csv_files", {})
+            # Step 1: Generate timestamp for filename
+            timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
             
-            # Step 2: Validate that we have data
-            if not csv_files:
-                raise ValueError("No data found for this project")
+            # Step 2: Stream every table's CSV straight into the ZIP file in memory
+            zip_buffer = BytesIO()
+            # compresslevel=1: CSV still compresses well, at a fraction of the default level's CPU cost
+            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
+                files_written = self._write_all_data_to_zip(project_id, zip_file)
             
-            # Step 3: Generate timestamp for filename
-            timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # Step 3: Validate that we have data
+            if files_written == 0:
+                raise ValueError("No data found for this project")
             
             # Step 4: Get project name for meaningful filename
             project = project_service.get_project(project_id)
@@ -909,19 +1137,11 @@ Scraped Content:
             
             # Step 5: Sanitize project name for filename
             # Remove special characters, keep alphanumeric, spaces, hyphens, underscores
-            safe_project_name = re.sub(r'[^\w\s-]', '', project_name).strip().replace(' ', '_')
+            safe_project_name = FILENAME_UNSAFE_PATTERN.sub('', project_name).strip().replace(' ', '_')
             
             # Step 6: Generate ZIP filename
             zip_filename = f"{safe_project_name}_serp_lead_gen_{timestamp_str}.zip"
             
-            # Step 7: Create ZIP file in memory
-            zip_buffer = BytesIO()
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for name, csv_content in csv_files.items():
-                    # Encode CSV with UTF-8 BOM for Excel compatibility
-                    zip_file.writestr(f"serp_{name}.csv", csv_content.encode('utf-8-sig'))
-            
-            zip_buffer.seek(0)
             zip_bytes = zip_buffer.getvalue()
             
             logger.info(f"✅ Generated ZIP file for project {project_id}: {zip_filename} ({len(zip_bytes)} bytes)")
@@ -3,25 +3,55 @@ Merged results service for combining SERP leads and dataset leads
 """
 import logging
 import re
-import csv
+import codecs
+import threading
 import zipfile
-from io import StringIO, BytesIO
+from io import BytesIO
 from datetime import datetime
-from sqlalchemy import text
+from sqlalchemy import text, select, update, literal_column, table, column
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import SQLAlchemyError
 import json
 
 from .database_service import db_service
 from .project_service import project_service
 from ..models.tables import SerpLeadAggregated, Dataset, ProjectDataset, MergedResult
-from ..utils.lead_utils import normalize_lead_name, sanitize_value
+from ..utils.lead_utils import sanitize_value
 
 logger = logging.getLogger(__name__)
 
+# Characters stripped from project names when building download filenames
+FILENAME_UNSAFE_PATTERN = re.compile(r'[^\w\s-]')
+
 
 class MergedResultsService:
     """Service for merging SERP leads and dataset leads into merged_results table"""
 
+    def __init__(self):
+        """Initialise the cache of merged_results column names"""
+        # Column names only change when an enrichment column is added, so cache them
+        # instead of querying information_schema on every view/export
+        self._columns_cache: list[str] | None = None
+        self._columns_lock = threading.Lock()
+
+    def _get_column_names(self, session) -> list[str]:
+        """
+        Get all column names of merged_results (including dynamic enrichment columns)
+        in table order, from cache if available.
+        """
+        if self._columns_cache is None:
+            with self._columns_lock:
+                if self._columns_cache is None:
+                    columns_query = text("""
+                        SELECT column_name 
+                        FROM information_schema.columns 
+                        WHERE table_name = 'merged_results'
+                        ORDER BY ordinal_position
+                    """)
+                    columns_result = session.execute(columns_query).fetchall()
+                    self._columns_cache = [row[0] for row in columns_result]
+        return self._columns_cache
+
     def _ensure_enrichment_column_exists(self, column_name: str) -> bool:
         """
         Ensure an enrichment column exists in merged_results table.
@@ -41,6 +71,10 @@ class MergedResultsService:
                 logger.error(f"Invalid column name: {column_name}")
                 return False
             
+            # Known columns don't need a catalog lookup
+            if self._columns_cache is not None and safe_column_name in self._columns_cache:
+                return True
+            
             with db_service.get_session() as session:
                 # Check if column exists
                 check_query = text("""
@@ -55,14 +89,18 @@ class MergedResultsService:
                     # Column already exists
                     return True
                 
-                # Add column if it doesn't exist
+                # Add column if it doesn't exist - quoted like the upsert/select that use it, so
+                # reserved words (e.g. "order") and names starting with a digit still work
                 alter_query = text(f"""
                     ALTER TABLE merged_results 
-                    ADD COLUMN {safe_column_name} TEXT
+                    ADD COLUMN "{safe_column_name}" TEXT
                 """)
                 session.execute(alter_query)
                 session.commit()
                 
+                # Column list changed - next read refreshes the cache
+                self._columns_cache = None
+                
                 logger.info(f"✅ Added enrichment column '{safe_column_name}' to merged_results table")
                 return True
                 
@@ -70,6 +108,18 @@ class MergedResultsService:
             logger.error(f"❌ Error ensuring enrichment column '{column_name}' exists: {str(e)}")
             return False
 
+    def _reset_serp_counts_statement(self, project_id: int):
+        """
+        Core UPDATE setting serp_count to NULL for every merged result of a project.
+        synchronize_session=False skips the ORM pre-select/in-memory evaluation.
+        """
+        return (
+            update(MergedResult)
+            .where(MergedResult.project_id == project_id)
+            .values(serp_count=None)
+            .execution_options(synchronize_session=False)
+        )
+
     def merge_serp_leads(self, project_id: int) -> dict:
         """
         Merge aggregated SERP leads into merged_results table.
@@ -88,62 +138,42 @@ class MergedResultsService:
         """
         try:
             with db_service.get_session() as session:
-                # Get all aggregated SERP leads for this project
-                aggregated_leads = session.query(SerpLeadAggregated).filter(
-                    SerpLeadAggregated.project_id == project_id
-                ).all()
+                # Step 1: Reset all SERP counts to NULL (preserve enrichment columns)
+                # This handles cases where leads were removed from SERP results
+                session.execute(self._reset_serp_counts_statement(project_id))
+                
+                # Step 2: Insert or update with latest SERP counts straight from serp_leads_aggregated
+                # (INSERT ... SELECT runs entirely in Postgres - no rows are loaded into Python).
+                # Lead names are normalized once when extracted, so no need to normalize again here
+                aggregated_leads = select(
+                    SerpLeadAggregated.project_id,
+                    SerpLeadAggregated.leads,
+                    SerpLeadAggregated.serp_count
+                ).where(SerpLeadAggregated.project_id == project_id)
+                
+                statement = insert(MergedResult).from_select(
+                    ['project_id', 'lead', 'serp_count'], aggregated_leads
+                )
+                statement = statement.on_conflict_do_update(
+                    index_elements=['project_id', 'lead'],
+                    set_=dict(serp_count=statement.excluded.serp_count)
+                ).returning(
+                    # xmax is 0 only for freshly inserted rows - lets us report new vs updated
+                    literal_column("xmax = 0")
+                )
+                inserted_flags = session.execute(statement).scalars().all()
+                session.commit()
                 
-                if not aggregated_leads:
+                if not inserted_flags:
                     logger.info(f"No aggregated SERP leads found for project {project_id} to merge")
-                    # Clear SERP counts for existing records (they may have been removed)
-                    session.query(MergedResult).filter(
-                        MergedResult.project_id == project_id
-                    ).update({"serp_count": None})
-                    session.commit()
                     return {
                         "success": True,
                         "leads_merged": 0,
                         "message": "No aggregated SERP leads found to merge"
                     }
                 
-                # Step 1: Reset all SERP counts to NULL (preserve enrichment columns)
-                # This handles cases where leads were removed from SERP results
-                session.query(MergedResult).filter(
-                    MergedResult.project_id == project_id
-                ).update({"serp_count": None})
-                
-                merged_count = 0
-                updated_count = 0
-                
-                # Step 2: Insert or update with latest SERP counts
-                for agg_lead in aggregated_leads:
-                    # Normalize lead name (already normalized in aggregation, but ensure consistency)
-                    normalized_lead = normalize_lead_name(agg_lead.leads)
-                    
-                    if not normalized_lead:
-                        continue
-                    
-                    # Check if lead already exists in merged_results
-                    existing = session.query(MergedResult).filter(
-                        MergedResult.project_id == project_id,
-                        MergedResult.lead == normalized_lead
-                    ).first()
-                    
-                    if existing:
-                        # Update existing record with latest SERP count
-                        existing.serp_count = agg_lead.serp_count
-                        updated_count += 1
-                    else:
-                        # Create new merged result (only SERP data, no enrichment yet)
-                        merged_result = MergedResult(
-                            project_id=project_id,
-                            lead=normalized_lead,
-                            serp_count=agg_lead.serp_count
-                        )
-                        session.add(merged_result)
-                        merged_count += 1
-                
-                session.commit()
+                merged_count = sum(1 for inserted in inserted_flags if inserted)
+                updated_count = len(inserted_flags) - merged_count
                 
                 total_processed = merged_count + updated_count
                 logger.info(f"✅ Merged {total_processed} SERP leads for project {project_id} ({merged_count} new, {updated_count} updated)")
@@ -181,9 +211,12 @@ class MergedResultsService:
                     raise Exception(f"Failed to ensure enrichment column '{col}' exists")
             
             with db_service.get_session() as session:
-                # Get all dataset rows for this project_dataset
-                dataset_rows = session.query(Dataset).filter(
-                    Dataset.project_dataset_id == project_dataset_id
+                # Get all dataset rows for this project_dataset in one query - only the two
+                # columns the merge needs, as plain rows rather than ORM objects
+                dataset_rows = session.execute(
+                    select(Dataset.lead, Dataset.enrichment_value).where(
+                        Dataset.project_dataset_id == project_dataset_id
+                    )
                 ).all()
                 
                 if not dataset_rows:
@@ -194,22 +227,11 @@ class MergedResultsService:
                         "message": "No dataset rows found to merge"
                     }
                 
-                merged_count = 0
-                updated_count = 0
-                
+                # Build one row per lead with all enrichment column values
+                # Keyed by lead: different raw names can normalize to the same lead, and one upsert
+                # batch cannot update the same row twice (last row wins, as before)
+                rows_by_lead = {}
                 for dataset_row in dataset_rows:
-                    # Normalize lead name
-                    normalized_lead = normalize_lead_name(dataset_row.lead)
-                    
-                    if not normalized_lead:
-                        continue
-                    
-                    # Check if lead already exists in merged_results
-                    existing = session.query(MergedResult).filter(
-                        MergedResult.project_id == project_id,
-                        MergedResult.lead == normalized_lead
-                    ).first()
-                    
                     # Parse enrichment value(s)
                     if len(enrichment_column_list) == 1:
                         # Single column - use value directly
@@ -221,45 +243,42 @@ class MergedResultsService:
                         except:
                             enrichment_values = {}
                     
-                    if existing:
-                        # Update existing record with enrichment value(s)
-                        for col_name, col_value in enrichment_values.items():
-                            safe_column_name = sanitize_value(col_name)
-                            update_query = text(f"""
-                                UPDATE merged_results 
-                                SET {safe_column_name} = :enrichment_value
-                                WHERE id = :id
-                            """)
-                            session.execute(update_query, {
-                                "enrichment_value": col_value,
-                                "id": existing.id
-                            })
-                        updated_count += 1
-                    else:
-                        # Create new merged result
-                        # First insert with fixed columns
-                        merged_result = MergedResult(
-                            project_id=project_id,
-                            lead=normalized_lead,
-                            serp_count=0  # No SERP data yet
-                        )
-                        session.add(merged_result)
-                        session.flush()  # Get the ID
-                        
-                        # Then update the dynamic enrichment column(s)
-                        for col_name, col_value in enrichment_values.items():
-                            safe_column_name = sanitize_value(col_name)
-                            update_query = text(f"""
-                                UPDATE merged_results 
-                                SET {safe_column_name} = :enrichment_value
-                                WHERE id = :id
-                            """)
-                            session.execute(update_query, {
-                                "enrichment_value": col_value,
-                                "id": merged_result.id
-                            })
-                        
-                        merged_count += 1
+                    # Lead names are normalized once on upload, so no need to normalize again here
+                    row = {
+                        "project_id": project_id,
+                        "lead": dataset_row.lead,
+                        "serp_count": 0  # No SERP data yet (left untouched for existing leads)
+                    }
+                    for col_name in enrichment_column_list:
+                        row[sanitize_value(col_name)] = enrichment_values.get(col_name)
+                    rows_by_lead[dataset_row.lead] = row
+                
+                # Enrichment columns are added dynamically so they aren't on the MergedResult model -
+                # describe them with a lightweight table clause so the upsert can reference them
+                safe_column_names = [sanitize_value(col_name) for col_name in enrichment_column_list]
+                merged_results_table = table(
+                    "merged_results",
+                    column("project_id"),
+                    column("lead"),
+                    column("serp_count"),
+                    *[column(col_name) for col_name in safe_column_names]
+                )
+                
+                # Insert new leads and update enrichment values of existing ones in a single upsert,
+                # run as an executemany (rows passed as parameters, not inlined with .values()) so
+                # SQLAlchemy sends it in batched pages that still support RETURNING
+                statement = insert(merged_results_table)
+                statement = statement.on_conflict_do_update(
+                    index_elements=['project_id', 'lead'],
+                    set_={col_name: statement.excluded[col_name] for col_name in safe_column_names}
+                ).returning(
+                    # xmax is 0 only for freshly inserted rows - lets us report new vs updated
+                    literal_column("xmax = 0")
+                )
+                inserted_flags = session.execute(statement, list(rows_by_lead.values())).scalars().all()
+                
+                merged_count = sum(1 for inserted in inserted_flags if inserted)
+                updated_count = len(inserted_flags) - merged_count
                 
                 session.commit()
                 
@@ -292,14 +311,7 @@ class MergedResultsService:
         try:
             with db_service.get_session() as session:
                 # First, get all column names for merged_results table (including dynamic ones)
-                columns_query = text("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'merged_results'
-                    ORDER BY ordinal_position
-                """)
-                columns_result = session.execute(columns_query).fetchall()
-                column_names = [row[0] for row in columns_result]
+                column_names = self._get_column_names(session)
                 
                 # Get all merged results for this project using raw SQL to include dynamic columns
                 columns_str = ", ".join([f'"{col}"' for col in column_names])
@@ -341,77 +353,6 @@ class MergedResultsService:
             logger.error(f"❌ Error getting merged results: {str(e)}")
             raise
 
-    def export_merged_results_as_csv(self, project_id: int) -> dict:
-        """
-        Export merged_results table as CSV for a project.
-        Handles dynamic enrichment columns.
-        
-        Args:
-            project_id: Project ID to export merged results for
-            
-        Returns:
-            dict: Dictionary with CSV content as string
-        """
-        try:
-            with db_service.get_session() as session:
-                # First, get all column names for merged_results table (including dynamic ones)
-                columns_query = text("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'merged_results'
-                    ORDER BY ordinal_position
-                """)
-                columns_result = session.execute(columns_query).fetchall()
-                column_names = [row[0] for row in columns_result]
-                
-                # Get all merged results for this project using raw SQL to include dynamic columns
-                # Build dynamic column list for SELECT
-                columns_str = ", ".join([f'"{col}"' for col in column_names])
-                
-                select_query = text(f"""
-                    SELECT {columns_str}
-                    FROM merged_results
-                    WHERE project_id = :project_id
-                """)
-                
-                results = session.execute(select_query, {"project_id": project_id}).fetchall()
-                
-                if not results:
-                    return {"csv_content": None, "message": "No merged results found for this project"}
-                
-                # Create CSV
-                output = StringIO()
-                writer = csv.writer(output)
-                
-                # Write header row
-                writer.writerow(column_names)
-                
-                # Write data rows
-                for row_data in results:
-                    row = []
-                    for idx, col_name in enumerate(column_names):
-                        value = row_data[idx]
-                        
-                        # Format the value
-                        if value is None:
-                            row.append("")
-                        elif isinstance(value, datetime):
-                            row.append(value.isoformat())
-                        else:
-                            row.append(str(value))
-                    
-                    writer.writerow(row)
-                
-                csv_content = output.getvalue()
-                
-                logger.info(f"✅ Exported {len(results)} merged results for project {project_id}")
-                
-                return {"csv_content": csv_content, "row_count": len(results)}
-                
-        except Exception as e:
-            logger.error(f"❌ Error exporting merged results as CSV: {str(e)}")
-            raise
-
     def export_merged_results_as_zip(self, project_id: int) -> tuple[bytes, str]:
         """
         Export merged_results table as a ZIP file containing CSV.
@@ -428,37 +369,49 @@ class MergedResultsService:
             ValueError: If no data found for project or project doesn't exist
         """
         try:
-            # Step 1: Get CSV data
-            export_result = self.export_merged_results_as_csv(project_id)
-            csv_content = export_result.get("csv_content")
+            # Step 1: Generate timestamp for filename
+            timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
             
-            # Step 2: Validate that we have data
-            if not csv_content:
-                raise ValueError("No merged results found for this project")
+            # Step 2: Stream the CSV straight from Postgres into the ZIP entry.
+            # COPY serializes rows server-side, so Python only ever handles bytes
+            zip_buffer = BytesIO()
+            with db_service.get_session() as session:
+                column_names = self._get_column_names(session)
+                columns_str = ", ".join([f'"{col}"' for col in column_names])
+                copy_query = (
+                    f"COPY (SELECT {columns_str} FROM merged_results "
+                    f"WHERE project_id = {int(project_id)}) TO STDOUT WITH CSV HEADER"
+                )
+                
+                # compresslevel=1: CSV still compresses well, at a fraction of the default level's CPU cost
+                with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
+                    with zip_file.open("merged_results.csv", "w") as csv_file:
+                        # Write UTF-8 BOM for Excel compatibility
+                        csv_file.write(codecs.BOM_UTF8)
+                        cursor = session.connection().connection.cursor()
+                        try:
+                            cursor.copy_expert(copy_query, csv_file)
+                            row_count = cursor.rowcount
+                        finally:
+                            cursor.close()
             
-            # Step 3: Generate timestamp for filename
-            timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # Step 3: Validate that we have data
+            if row_count <= 0:
+                raise ValueError("No merged results found for this project")
             
             # Step 4: Get project name for meaningful filename
             project = project_service.get_project(project_id)
             project_name = project.project_name
             
             # Step 5: Sanitize project name for filename
-            safe_project_name = re.sub(r'[^\w\s-]', '', project_name).strip().replace(' ', '_')
+            safe_project_name = FILENAME_UNSAFE_PATTERN.sub('', project_name).strip().replace(' ', '_')
             
             # Step 6: Generate ZIP filename
             zip_filename = f"{safe_project_name}_merged_results_{timestamp_str}.zip"
             
-            # Step 7: Create ZIP file in memory
-            zip_buffer = BytesIO()
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                # Encode CSV with UTF-8 BOM for Excel compatibility
-                zip_file.writestr("merged_results.csv", csv_content.encode('utf-8-sig'))
-            
-            zip_buffer.seek(0)
             zip_bytes = zip_buffer.getvalue()
             
-            logger.info(f"✅ Generated merged results ZIP file for project {project_id}: {zip_filename} ({len(zip_bytes)} bytes)")
+            logger.info(f"✅ Generated merged results ZIP file for project {project_id}: {zip_filename} ({len(zip_bytes)} bytes, {row_count} rows)")
             
             return zip_bytes, zip_filename
                 
@@ -2,11 +2,13 @@
 Project service for managing project operations
 """
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import or_
+from sqlalchemy import or_, delete
 from typing import List, Optional
+from cachetools import TTLCache
+import threading
 import logging
 
-from ..models.tables import Project, SerpUrl, SerpLead, SerpQuery, ProjectDataset, MergedResult
+from ..models.tables import Project, SerpUrl, ProjectDataset, MergedResult
 from .database_service import db_service
 
 logger = logging.getLogger(__name__)
@@ -14,6 +16,34 @@ logger = logging.getLogger(__name__)
 class ProjectService:
     """Service for project-related database operations"""
 
+    # Project fields that update_project is allowed to change (mirrors schemas.ProjectUpdate)
+    UPDATABLE_FIELDS = frozenset({
+        "project_name",
+        "description",
+        "query_search_target",
+        "leads_collected",
+        "datasets_added",
+        "urls_processed",
+    })
+
+    def __init__(self):
+        """Initialise the short-lived cache of project lookups"""
+        # Projects are read on every export/query generation but rarely change,
+        # so keep them for a minute; writes below invalidate the cached entry
+        self._project_cache = TTLCache(maxsize=1024, ttl=60)
+        self._project_cache_lock = threading.Lock()
+
+    def invalidate_project_cache(self, project_id: Optional[int] = None) -> None:
+        """
+        Drop a cached project (or every cached project when project_id is None).
+        Call after writing anything get_project reports, e.g. URLs counted in urls_processed.
+        """
+        with self._project_cache_lock:
+            if project_id is None:
+                self._project_cache.clear()
+            else:
+                self._project_cache.pop(project_id, None)
+
     def create_project(self, 
         project_name: str, 
         description: Optional[str] = None,
@@ -32,8 +62,7 @@ class ProjectService:
                     description=description,
                     query_search_target=query_search_target)
                 session.add(project)
-                session.commit() #save data to database
-                session.refresh(project) # updates python object with database values to return 
+                session.commit() #save data to database (id and defaults are populated on flush - no refresh needed)
                 logger.info(f"✅ Created project: {project_name}")
                 return project
         except ValueError:
@@ -56,16 +85,24 @@ class ProjectService:
             raise
     
     def get_project(self, project_id: int) -> Optional[Project]:
-        """Get specific project by ID, refreshing counts from database before returning"""
+        """Get specific project by ID, refreshing counts from database before returning (cached for 60s)"""
         try:
+            with self._project_cache_lock:
+                cached_project = self._project_cache.get(project_id)
+            if cached_project is not None:
+                return cached_project
+            
             # Refresh project counts first to ensure accuracy
             self.update_project_counts_from_db(project_id)
             
             with db_service.get_session() as session:
-                project = session.query(Project).filter(Project.id == project_id).first()
+                project = session.get(Project, project_id)
                 if not project:
                     raise ValueError(f"Project with ID {project_id} does not exist. Please create the project first.")
-                return project
+            
+            with self._project_cache_lock:
+                self._project_cache[project_id] = project
+            return project
         except ValueError:
             # Re-raise ValueError (project not found)
             raise
@@ -73,21 +110,39 @@ class ProjectService:
             logger.error(f"❌ Error getting project {project_id}: {e}")
             raise
     
+    def project_exists(self, project_id: int) -> bool:
+        """Check a project exists, answering from the project cache when possible (no count refresh)"""
+        with self._project_cache_lock:
+            if project_id in self._project_cache:
+                return True
+        
+        with db_service.get_session() as session:
+            return session.get(Project, project_id) is not None
+    
     def update_project(self, project_id: int, **kwargs) -> Optional[Project]:
         """Update project fields"""
         try:
             with db_service.get_session() as session:
-                project = session.query(Project).filter(Project.id == project_id).first()
+                project = session.get(Project, project_id)
                 if not project:
                     logger.warning(f"Project {project_id} not found")
                     return None
                 
+                changed = False
                 for key, value in kwargs.items():
-                    if hasattr(project, key):
+                    if key not in self.UPDATABLE_FIELDS:
+                        logger.warning(f"Ignoring non-updatable project field '{key}'")
+                    elif getattr(project, key) != value:
                         setattr(project, key, value)
+                        changed = True
+                
+                # Idempotent re-submits skip the commit (and last_updated bump) entirely
+                if not changed:
+                    logger.info(f"⏭️ No changes for project {project_id}")
+                    return project
                 
                 session.commit()
-                session.refresh(project)
+                self.invalidate_project_cache(project_id)
                 logger.info(f"✅ Updated project {project_id}")
                 return project
         except SQLAlchemyError as e:
@@ -98,23 +153,20 @@ class ProjectService:
         """Delete project by ID, including all related records (cascade deletes automatically)"""
         try:
             with db_service.get_session() as session:
-                project = session.query(Project).filter(Project.id == project_id).first()
-                if not project:
+                # Single DELETE - every child table's foreign key is ON DELETE CASCADE, so
+                # Postgres removes the related records (serp_queries, serp_urls, serp_leads,
+                # project_datasets and their dataset rows, merged_results) without loading them
+                result = session.execute(
+                    delete(Project).where(Project.id == project_id)
+                )
+                session.commit()
+                self.invalidate_project_cache(project_id)
+                
+                if result.rowcount == 0:
                     logger.warning(f"Project {project_id} not found")
                     return False
                 
-                # Count related records for logging (before deletion)
-                leads_count = session.query(SerpLead).filter(SerpLead.project_id == project_id).count()
-                urls_count = session.query(SerpUrl).filter(SerpUrl.project_id == project_id).count()
-                queries_count = session.query(SerpQuery).filter(SerpQuery.project_id == project_id).count()
-                datasets_count = session.query(ProjectDataset).filter(ProjectDataset.project_id == project_id).count()
-                
-                # Delete the project - cascade will automatically delete all related records
-                # (serp_queries, serp_urls, serp_leads, project_datasets and their dataset rows)
-                session.delete(project)
-                session.commit()
-                
-                logger.info(f"✅ Deleted project {project_id} and {leads_count} leads, {urls_count} URLs, {queries_count} queries, {datasets_count} datasets (cascade delete)")
+                logger.info(f"✅ Deleted project {project_id} and all related records (cascade delete)")
                 return True
         except SQLAlchemyError as e:
             logger.error(f"❌ Error deleting project {project_id}: {e}")
@@ -136,7 +188,7 @@ class ProjectService:
             with db_service.get_session() as session:
                 if project_id is not None:
                     # Update specific project
-                    project = session.query(Project).filter(Project.id == project_id).first()
+                    project = session.get(Project, project_id)
                     if not project:
                         logger.warning(f"Project {project_id} not found for count update")
                         return False
@@ -163,6 +215,7 @@ class ProjectService:
                     project.datasets_added = datasets_count
                     
                     session.commit()
+                    self.invalidate_project_cache(project_id)
                     logger.info(f"✅ Updated counts for project {project_id}: {urls_count} processed URLs, {leads_count} leads, {datasets_count} datasets")
                     return True
                 else:
@@ -194,6 +247,7 @@ class ProjectService:
                         updated_count += 1
                     
                     session.commit()
+                    self.invalidate_project_cache()
                     logger.info(f"✅ Updated counts for {updated_count} project(s)")
                     return True
                 
@@ -3,21 +3,77 @@
 Service for testing lead extraction prompts using test URLs
 """
 import logging
+import asyncio
+import pandas as pd
 from agents import Agent, Runner, function_tool, set_default_openai_key
+from sqlalchemy import select, update
 from sqlalchemy.dialects.postgresql import insert
 
 from .database_service import db_service
-from ..utils.scrapers import jina_serp_scraper, jina_url_scraper
+from ..utils.scrapers import jina_serp_scraper, jina_url_scraper_async
 from ..config import settings
 from ..prompts import SERP_EXTRACTION_PROMPT
 from ..models.tables import TestSerpUrl
 
 logger = logging.getLogger(__name__)
 
+# Upsert for search result URLs, built once so SQLAlchemy's compiled-statement cache is hit
+# on every call - rows are passed as executemany parameters instead of being baked into the SQL
+_url_insert = insert(TestSerpUrl)
+TEST_URL_UPSERT = _url_insert.on_conflict_do_update(
+    index_elements=['link'],
+    set_=dict(
+        title=_url_insert.excluded.title,
+        snippet=_url_insert.excluded.snippet
+    ),
+    # Only rewrite rows whose title/snippet actually changed - re-running the same
+    # query otherwise creates a new row version (and WAL) for every existing link
+    where=(
+        TestSerpUrl.title.is_distinct_from(_url_insert.excluded.title)
+        | TestSerpUrl.snippet.is_distinct_from(_url_insert.excluded.snippet)
+    )
+)
+
+# Above this many leads the pandas .str pipeline beats a Python loop; below it the Series overhead dominates
+LEAD_VECTORIZE_THRESHOLD = 200
+INVALID_LEAD_VALUES = ['', '[]', 'None', 'null']
+
+def _clean_leads(leads: list) -> list:
+    """Strip quotes/brackets from agent output and drop empty or placeholder leads"""
+    if len(leads) > LEAD_VECTORIZE_THRESHOLD and all(isinstance(lead, str) for lead in leads):
+        series = pd.Series(leads, dtype="string")
+        series = series.str.strip().str.strip('[]').str.strip("'").str.strip('"')
+        mask = series.str.len().gt(0) & ~series.isin(INVALID_LEAD_VALUES)
+        return series[mask].tolist()
+    
+    cleaned_leads = []
+    for lead in leads:
+        if isinstance(lead, str):
+            # Remove quotes and brackets, check if it's meaningful
+            clean_lead = lead.strip().strip('[]').strip("'").strip('"')
+            if clean_lead and clean_lead not in INVALID_LEAD_VALUES:
+                cleaned_leads.append(clean_lead)
+        elif lead and str(lead).strip():
+            cleaned_leads.append(str(lead).strip())
+    return cleaned_leads
+
 # Disable noisy third-party logs
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("openai").setLevel(logging.WARNING)
 
+# we use this decorator for tools to openai agent sdk.
+# Module-level (not a method) so the tool is a plain function with a stable `url` signature
+@function_tool
+async def scrape_test_url(url: str) -> str:
+    """
+    This tool asynchronously scrapes the url provided and returns a string of the website scraped.
+    Use this tool when the search result seems to provide relevant leads e.g. 
+    "Top 100 environmental companies" and you need more information than what is provided in the
+    snippet and title to extract leads.
+    """
+    logger.info(f"Scraping URL: {url}")
+    return await jina_url_scraper_async(url)
+
 class TestLeadExtractionPromptsService:
     """Service for testing lead extraction prompts using test URLs"""
     
@@ -28,6 +84,15 @@ class TestLeadExtractionPromptsService:
         
         # Set default OpenAI key for agents SDK
         set_default_openai_key(settings.openai_api_key)
+        
+        # Build the extraction agent once and reuse it for every URL - the Agent is just the
+        # spec (prompt, tools, output type); each Runner.run keeps its own state
+        self._agent = Agent(
+            name="Lead Generator",
+            instructions=SERP_EXTRACTION_PROMPT,
+            tools=[scrape_test_url],
+            output_type=list[str], # Specify the output type as a list of strings
+        )
 
     def generate_and_add_test_urls_to_table(self, project_id: int, query: str) -> dict:
         """
@@ -40,34 +105,27 @@ class TestLeadExtractionPromptsService:
         try:
             with db_service.get_session() as session:
                 # STEP 1: Collect all generated urls first using jina_serp_scraper
-                all_urls = []
-                seen_links = set()  # Track unique links to avoid duplicates
+                # Keyed by link - one upsert statement can't affect the same link twice
+                # (Postgres raises CardinalityViolation), so keep the first result per link
+                urls_by_link = {}
                 
                 # extract the urls using Serpapi
                 serp_object = jina_serp_scraper(query)
                 for serp_result in serp_object:
                     link = serp_result.get('url')
-                    # Only add if we haven't seen this link before in this batch
-                    if link and link not in seen_links:
-                        seen_links.add(link)
-                        all_urls.append({
+                    if link and link not in urls_by_link:
+                        urls_by_link[link] = {
                             'project_id': project_id,
                             'query': query,
                             'title': serp_result.get('title'),
                             'link': link,
                             'snippet': serp_result.get('description')
-                        })
+                        }
+                all_urls = list(urls_by_link.values())
 
                 # Step 2: Batch upsert using SQLAlchemy core - save to TestSerpUrl table
-                statement = insert(TestSerpUrl).values(all_urls)
-                statement = statement.on_conflict_do_update(
-                    index_elements=['link'],
-                    set_=dict(
-                        title=statement.excluded.title,
-                        snippet=statement.excluded.snippet
-                    )
-                )
-                session.execute(statement)
+                if all_urls:
+                    session.execute(TEST_URL_UPSERT, all_urls)
                 session.commit()
                 logger.info(f"✅ Processed {len(all_urls)} test URLs for query: {query}")
             
@@ -84,32 +142,13 @@ class TestLeadExtractionPromptsService:
                 raise ValueError(f"Project with ID {project_id} does not exist. Please create the project first.")
             raise
 
-    # we use this decorator for tools to openai agent sdk
-    @function_tool
-    async def _scrape_test_url(url: str) -> str:
-        """
-        This tool asynchronously scrapes the url provided and returns a string of the website scraped.
-        Use this tool when the search result seems to provide relevant leads e.g. 
-        "Top 100 environmental companies" and you need more information than what is provided in the
-        snippet and title to extract leads.
-        """
-        logger.info(f"Scraping URL: {url}")
-        return jina_url_scraper(url)
-    
     async def _test_lead_extractor(self, query, title, snippet, url) -> tuple[list, str | None]:
         """
         Extract leads from test URLs for prompt testing/validation.
         Returns extracted leads and scraped content (if any).
         """
-        agent = Agent(
-            name="Lead Generator",
-            instructions=SERP_EXTRACTION_PROMPT,
-            tools=[self._scrape_test_url],
-            output_type=list[str], # Specify the output type as a list of strings
-
-        )
         # this runner class is async -> Runner.run(), which runs async and returns a RunResult. 
-        result = await Runner.run(agent, 
+        result = await Runner.run(self._agent, 
                                 input=f"""
                                     Search Result:
                                     Query: {query}
@@ -122,7 +161,7 @@ class TestLeadExtractionPromptsService:
             if getattr(item, "type", None) == "tool_call_output_item":
                 scraped_content = getattr(item, "output", None)
 
-                # scraped content is already cleaned by jina_url_scraper
+                # scraped content is already cleaned by jina_url_scraper_async
                 logger.info("Tool output (scraped content) found.")
         logger.info(f"Final output (company names): {result.final_output}")
         # enforce list type for leads
@@ -155,8 +194,16 @@ class TestLeadExtractionPromptsService:
                 session.commit()
                 
                 # Step 2: Get all test URLs for this project (now all are unprocessed)
-                unprocessed_urls = session.query(TestSerpUrl).filter(
-                    TestSerpUrl.project_id == project_id
+                # Only the columns extraction reads, as plain rows - website_scraped can hold whole
+                # scraped pages and is only ever written here, so it is never loaded
+                unprocessed_urls = session.execute(
+                    select(
+                        TestSerpUrl.id,
+                        TestSerpUrl.query,
+                        TestSerpUrl.title,
+                        TestSerpUrl.snippet,
+                        TestSerpUrl.link
+                    ).where(TestSerpUrl.project_id == project_id)
                 ).all()
                 
                 if not unprocessed_urls:
@@ -177,15 +224,18 @@ class TestLeadExtractionPromptsService:
                 skipped_count = 0
                 failed_count = 0
                 all_extracted_leads = []  # Collect all results to return in response (including skipped/failed)
+                # New status/website_scraped per URL id - written in one bulk UPDATE at the end
+                # instead of dirtying each ORM object (one UPDATE statement per URL on commit)
+                status_updates = {}
                 
-                # Step 2: Process each URL
-                for url_record in unprocessed_urls:
-                    try:
+                # Step 2: Extract leads from all URLs concurrently - each extraction is network-bound
+                # (LLM + scrape), bounded by a semaphore so we don't flood the APIs.
+                # ORM objects are only updated afterwards, outside the gather
+                semaphore = asyncio.Semaphore(settings.extraction_concurrency)
+                
+                async def _extract(url_record) -> tuple[list, str | None, Exception | None]:
+                    async with semaphore:
                         logger.info(f"Processing test URL: {url_record.link}")
-                        
-                        # Extract leads using the _test_lead_extractor method
-                        leads = []
-                        scraped_content = None
                         try:
                             leads, scraped_content = await self._test_lead_extractor(
                                 query=url_record.query,
@@ -193,11 +243,21 @@ class TestLeadExtractionPromptsService:
                                 snippet=url_record.snippet,
                                 url=url_record.link
                             )
+                            return leads, scraped_content, None
                         except Exception as extract_error:
+                            return [], None, extract_error
+                
+                extraction_results = await asyncio.gather(
+                    *(_extract(url_record) for url_record in unprocessed_urls)
+                )
+                
+                # Step 3: Process each URL's results
+                for url_record, (leads, scraped_content, extract_error) in zip(unprocessed_urls, extraction_results):
+                    try:
+                        if extract_error is not None:
                             # Extraction failed - log but continue processing
                             logger.error(f"❌ Extraction error for {url_record.link}: {str(extract_error)}")
-                            url_record.status = "failed"
-                            url_record.website_scraped = None
+                            status_updates[url_record.id] = {"id": url_record.id, "status": "failed", "website_scraped": None}
                             failed_count += 1
                             
                             # Add failed URL to results
@@ -215,33 +275,20 @@ class TestLeadExtractionPromptsService:
                         # Clean up leads - handle AI returning ['[]'] or similar
                         if leads and isinstance(leads, list):
                             # Remove any strings that look like empty lists or invalid entries
-                            cleaned_leads = []
-                            for lead in leads:
-                                if isinstance(lead, str):
-                                    # Remove quotes and brackets, check if it's meaningful
-                                    clean_lead = lead.strip().strip('[]').strip("'").strip('"')
-                                    if clean_lead and clean_lead not in ['', '[]', 'None', 'null']:
-                                        cleaned_leads.append(clean_lead)
-                                elif lead and str(lead).strip():
-                                    cleaned_leads.append(str(lead).strip())
-                            
-                            leads = cleaned_leads
+                            leads = _clean_leads(leads)
                             logger.info(f"Cleaned leads: {leads}")
                         
-                        # Step 3: Update the URL record
-                        url_record.website_scraped = scraped_content
-                        
-                        # Step 4: Determine status based on results
+                        # Determine status based on results
                         if leads and isinstance(leads, list) and len(leads) > 0:
                             # Leads found - mark as processed
-                            url_record.status = "processed"
+                            status = "processed"
                             processed_count += 1
                             
                             logger.info(f"✅ Extracted {len(leads)} leads from {url_record.link}")
                             
                         else:
                             # No leads found - mark as skip
-                            url_record.status = "skip"
+                            status = "skip"
                             skipped_count += 1
                             logger.info(f"⏭️ No leads found in {url_record.link} - marked as skip")
                         
@@ -251,16 +298,18 @@ class TestLeadExtractionPromptsService:
                             "title": url_record.title,
                             "query": url_record.query,
                             "snippet": url_record.snippet,
-                            "status": url_record.status,
-                            "website_scraped": url_record.website_scraped,
+                            "status": status,
+                            "website_scraped": scraped_content,
                             "leads": leads if leads else []
                         })
+                        
+                        # Update the URL record
+                        status_updates[url_record.id] = {"id": url_record.id, "status": status, "website_scraped": scraped_content}
                             
                     except Exception as e:
                         # Unexpected error - mark as failed and continue processing
                         logger.error(f"❌ Unexpected error processing {url_record.link}: {str(e)}")
-                        url_record.status = "failed"
-                        url_record.website_scraped = None
+                        status_updates[url_record.id] = {"id": url_record.id, "status": "failed", "website_scraped": None}
                         failed_count += 1
                         
                         # Add failed URL to results
@@ -275,7 +324,9 @@ class TestLeadExtractionPromptsService:
                         })
                         # Continue to next URL - don't let one failure stop the whole process
                 
-                # Commit all changes (status and website_scraped updates)
+                # Write all status and website_scraped updates in one bulk UPDATE (by primary key), then commit
+                if status_updates:
+                    session.execute(update(TestSerpUrl), list(status_updates.values()))
                 session.commit()
                 
                 logger.info(f"✅ Test lead extraction completed for project {project_id}:")
@@ -3,6 +3,7 @@ Lead utility functions for normalizing and processing lead names
 """
 import re
 import unicodedata
+from functools import lru_cache
 
 # Common legal suffixes and noise words
 LEGAL_SUFFIXES = [
@@ -14,9 +15,34 @@ LEGAL_SUFFIXES = [
 # Convert to regex OR (e.g. r"\b(pty|ltd|inc|...)$") 
 LEGAL_SUFFIXES_REGEX = r"\b(?:{})\b".format("|".join([re.escape(s) for s in LEGAL_SUFFIXES]))
 
+# Characters not allowed in dynamic column names (compiled once - used on every merge)
+SANITIZE_VALUE_PATTERN = re.compile(r'[^a-zA-Z0-9_]')
+
+# normalize_lead_name lookups, built once at import (it runs for every extracted/uploaded lead)
+# ASCII punctuation & symbols -> space; lowercase letters, digits and whitespace are kept
+PUNCTUATION_TRANSLATION = str.maketrans({
+    char: " " for char in map(chr, range(128))
+    if not ("a" <= char <= "z" or char.isdigit() or char.isspace())
+})
+
+# Legal suffixes and standalone generic company terms, removed in a single sweep
+STOP_WORDS_PATTERN = re.compile(r"\b(?:{})\b".format("|".join(
+    [re.escape(s) for s in LEGAL_SUFFIXES] + ["company", "companies", "holdings?", "international"]
+)))
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a search query for deduplication: lowercase with whitespace collapsed,
+    so "AI  Startups " and "ai startups" count as the same search.
+    The Streamlit page's _normalize_query mirrors this to flag duplicates as they are added.
+    """
+    return " ".join(query.lower().split())
+
 def sanitize_value(value: str) -> str:
-    return re.sub(r'[^a-zA-Z0-9_]', '', value).lower()
+    return SANITIZE_VALUE_PATTERN.sub('', value).lower()
 
+# Pure function and the same company names recur across many pages/datasets, so memoize it
+@lru_cache(maxsize=100_000)
 def normalize_lead_name(name: str) -> str:
     """
     Clean and normalize company names for deduplication.
@@ -38,29 +64,21 @@ def normalize_lead_name(name: str) -> str:
     name = str(name)
 
     # 1. Unicode normalization (removes accents; “Crédit” -> “credit”)
-    name = unicodedata.normalize("NFKD", name)
-    name = name.encode("ASCII", "ignore").decode("ASCII")
-
-    # 2. Lowercase
-    name = name.lower()
-
-    # 3. Remove punctuation & special symbols
-    name = re.sub(r"[^a-z0-9\s]", " ", name)
+    # Dropping non-ASCII here also removes zero-width/invisible unicode chars (step 6).
+    # Most names are already ASCII, where NFKD + the ASCII round-trip change nothing
+    if not name.isascii():
+        name = unicodedata.normalize("NFKD", name)
+        name = name.encode("ASCII", "ignore").decode("ASCII")
 
-    # 4. Remove legal suffixes & generic company terms
-    # e.g. “Microsoft Pty Ltd” → “microsoft”
-    name = re.sub(LEGAL_SUFFIXES_REGEX, " ", name)
+    # 2 + 3. Lowercase, then punctuation & special symbols -> space in one translate pass
+    name = name.lower().translate(PUNCTUATION_TRANSLATION)
 
-    # Remove standalone generic words
-    name = re.sub(r"\b(company|companies|holdings?|international)\b", " ", name)
+    # 4. Remove legal suffixes & generic company terms in one sweep
+    # e.g. “Microsoft Pty Ltd” → “microsoft”, “ABC Holdings” → “abc”
+    name = STOP_WORDS_PATTERN.sub(" ", name)
 
     # 5. Collapse whitespace
-    name = re.sub(r"\s+", " ", name).strip()
-
-    # 6. Remove zero-width/invisible unicode chars
-    name = re.sub(r"[\u200b-\u200f\u202a-\u202e]", "", name)
-
-    return name.strip()
+    return " ".join(name.split())
 
 if __name__ == "__main__":
     # Example usage / debug runner
@@ -5,14 +5,27 @@ Jina Scrapers
 
 Note: They all cache content.
 """
+import asyncio
 import requests
-import json
-import ast
+import httpx
 import re
+import threading
+import time
 import unicodedata
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from ..config import settings
 
+# clean_content patterns, compiled once - it runs on every scraped page.
+# Everything that is deleted outright goes in one alternation so the page is scanned once:
+# 10+ dashes/equals/underscores/dots, zero-width characters and control characters (includes null bytes)
+STRIP_PATTERN = re.compile(
+    r'-{10,}|={10,}|_{10,}|\.{10,}'
+    r'|[\u200b-\u200d\ufeff\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]'
+)
+
 def clean_content(content: str) -> str:
     """
     Clean scraped content by removing weird characters, excessive whitespace, and formatting issues.
@@ -20,27 +33,18 @@ def clean_content(content: str) -> str:
     if not content:
         return content
     
-    # Remove excessive dashes and separators
-    content = re.sub(r'-{10,}', '', content)  # Remove 10+ consecutive dashes
-    content = re.sub(r'={10,}', '', content)  # Remove 10+ consecutive equals
-    content = re.sub(r'_{10,}', '', content)  # Remove 10+ consecutive underscores
-    content = re.sub(r'\.{10,}', '', content)  # Remove 10+ consecutive dots
-    
-    # Remove weird Unicode characters and control characters
-    content = re.sub(r'[\u200b-\u200d\ufeff]', '', content)  # Remove zero-width characters
-    content = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', content)  # Remove control characters (includes null bytes)
-    
-    # Normalize Unicode characters (convert to decomposed form)
-    content = unicodedata.normalize('NFKD', content)
+    # Remove excessive dashes/separators, zero-width characters and control characters in one pass
+    content = STRIP_PATTERN.sub('', content)
     
-    # Remove all newlines and carriage returns, replace with spaces
-    content = re.sub(r'[\r\n]+', ' ', content)  # Replace newlines/carriage returns with spaces
+    # Normalize Unicode characters - NFKC (not NFKD) so compatibility forms (fullwidth, ligatures)
+    # are still folded but accents stay composed: shorter text and fewer tokens for the LLM.
+    # Lead names get their own NFKD + ASCII folding in normalize_lead_name. ASCII is already normalized
+    if not content.isascii():
+        content = unicodedata.normalize('NFKC', content)
     
-    # Normalize all whitespace to single spaces and strip
-    content = re.sub(r'\s+', ' ', content).strip()
-    
-    # Clean UTF-8 encoding (removes any invalid UTF-8 sequences)
-    content = content.encode("utf-8", "ignore").decode("utf-8")
+    # Replace newlines and normalize all whitespace to single spaces, then strip - str.split()
+    # splits on the same characters as \s (including \r and \n) and drops leading/trailing whitespace
+    content = ' '.join(content.split())
 
     # Remove excessive whitespace while preserving paragraph structure [OLD CODE]
     #content = re.sub(r'\n\s*\n\s*\n+', '\n\n', content)  # Replace 3+ newlines with 2
@@ -48,35 +52,200 @@ def clean_content(content: str) -> str:
             
     return content
 
+JINA_URL_HEADERS = {
+    #"Authorization": f"Bearer jina_{settings.jina_api_key}",
+    "X-Md-Link-Style": "discarded",
+    "X-Remove-Selector": "header, footer, nav, aside, .subscribe, .paywall, .related, .comments, .share, .advertisement",
+    "X-Retain-Images": "none"
+}
+
+# Jina rate-limits (429) and occasionally returns 5xx - retry those with exponential backoff
+JINA_RETRY_STATUSES = (429, 500, 502, 503, 504)
+JINA_MAX_RETRIES = 3
+JINA_BACKOFF_FACTOR = 0.5
+
+def _retry_after_seconds(response) -> float | None:
+    """Seconds from a Retry-After header, or None if absent (or in the unused HTTP-date form)"""
+    value = response.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+def _retry_delay(response, attempt: int) -> float:
+    """How long to wait before retrying - the server's Retry-After if given, else exponential backoff"""
+    retry_after = _retry_after_seconds(response)
+    return retry_after if retry_after is not None else JINA_BACKOFF_FACTOR * 2 ** attempt
+
+class _RateLimiter:
+    """Spaces out request starts by min_interval seconds, and holds every caller back after a Retry-After"""
+    
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next_allowed = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def wait(self) -> None:
+        """Sleep until this caller may start a request"""
+        async with self._lock:
+            start = max(time.monotonic(), self._next_allowed)
+            await asyncio.sleep(start - time.monotonic())
+            self._next_allowed = start + self.min_interval
+    
+    def defer(self, seconds: float) -> None:
+        """Push the next allowed start at least `seconds` into the future (e.g. from a 429 Retry-After)"""
+        self._next_allowed = max(self._next_allowed, time.monotonic() + seconds)
+
+# Jina can return multi-MB markdown dumps - only the first 512KB is read and kept, so
+# concurrent scrapes hold at most N * JINA_MAX_BYTES in memory (and in website_scraped),
+# plus up to SCRAPE_CACHE_MAX_CHARS of cached pages
+JINA_MAX_BYTES = 512 * 1024
+JINA_CHUNK_SIZE = 32 * 1024
+
+# Shared sync session - pooled keep-alive connections plus retries on transient errors
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,  # number of per-host pools kept - only r.jina.ai and s.jina.ai are used
+    pool_maxsize=32,  # keep-alive connections per host
+    max_retries=Retry(
+        total=JINA_MAX_RETRIES,
+        backoff_factor=JINA_BACKOFF_FACTOR,
+        status_forcelist=JINA_RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"])
+    )
+)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+# Shared async client - keeps connections to Jina alive across scrapes (no new TCP+TLS
+# handshake per URL) and doesn't block the event loop while waiting on the network.
+# The transport retries failed connections; status retries are handled in jina_url_scraper_async
+_async_client = httpx.AsyncClient(
+    transport=httpx.AsyncHTTPTransport(retries=JINA_MAX_RETRIES),
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+    timeout=60,
+    follow_redirects=True
+)
+
+# Cleaned page content by URL for 24h - prompt testing re-runs extraction on the same URLs,
+# so repeat scrapes skip the network + Jina round trip. Only successful responses are cached.
+# Bounded by total characters rather than entry count - pages can be up to JINA_MAX_BYTES each,
+# so 512 entries could pin hundreds of MB; least recently used pages are evicted first
+SCRAPE_CACHE_MAX_CHARS = 32 * 1024 * 1024
+_scrape_cache = TTLCache(maxsize=SCRAPE_CACHE_MAX_CHARS, ttl=24 * 60 * 60, getsizeof=len)
+_scrape_cache_lock = threading.Lock()
+
+def _get_cached_scrape(url: str) -> str | None:
+    with _scrape_cache_lock:
+        return _scrape_cache.get(url)
+
+def _cache_scrape(url: str, content: str) -> None:
+    with _scrape_cache_lock:
+        _scrape_cache[url] = content
+
+def _read_capped(response: requests.Response) -> str:
+    """Read a streamed response body up to JINA_MAX_BYTES and decode it"""
+    buffer = bytearray()
+    for chunk in response.iter_content(chunk_size=JINA_CHUNK_SIZE):
+        buffer.extend(chunk)
+        if len(buffer) >= JINA_MAX_BYTES:
+            break
+    del buffer[JINA_MAX_BYTES:]  # truncate in place - slicing would copy the whole buffer
+    return buffer.decode(response.encoding or "utf-8", errors="replace")
+
+async def _read_capped_async(response: httpx.Response) -> str:
+    """Async version of _read_capped for streamed httpx responses"""
+    buffer = bytearray()
+    async for chunk in response.aiter_bytes(chunk_size=JINA_CHUNK_SIZE):
+        buffer.extend(chunk)
+        if len(buffer) >= JINA_MAX_BYTES:
+            break
+    del buffer[JINA_MAX_BYTES:]  # truncate in place - slicing would copy the whole buffer
+    return buffer.decode(response.encoding or "utf-8", errors="replace")
+
 def jina_url_scraper(url: str) -> str:
     """
     Uses jina api to scrape url and clean the content.
+    Pages scraped successfully in the last 24h are served from the scrape cache.
     """
-    url = f"https://r.jina.ai/{url}"
-    headers = {
-        #"Authorization": f"Bearer jina_{settings.jina_api_key}",
-        "X-Md-Link-Style": "discarded",
-        "X-Remove-Selector": "header, footer, nav, aside, .subscribe, .paywall, .related, .comments, .share, .advertisement",
-        "X-Retain-Images": "none"
-    }
-    response = requests.get(url, headers=headers)
-    raw_content = response.text
+    cached_content = _get_cached_scrape(url)
+    if cached_content is not None:
+        return cached_content
+    
+    with _session.get(f"https://r.jina.ai/{url}", headers=JINA_URL_HEADERS, stream=True, timeout=60) as response:
+        raw_content = _read_capped(response)
     
     # Clean the scraped content
     cleaned_content = clean_content(raw_content)
     
+    if response.ok:
+        _cache_scrape(url, cleaned_content)
     return cleaned_content
 
-def jina_serp_scraper(search_phrase:str) -> list[dict]:
-    url = 'https://s.jina.ai/'
+async def jina_url_scraper_async(url: str) -> str:
+    """
+    Async version of jina_url_scraper for the lead extractors, using the shared client.
+    Pages scraped successfully in the last 24h are served from the scrape cache.
+    """
+    cached_content = _get_cached_scrape(url)
+    if cached_content is not None:
+        return cached_content
+    
+    for attempt in range(JINA_MAX_RETRIES + 1):
+        async with _async_client.stream("GET", f"https://r.jina.ai/{url}", headers=JINA_URL_HEADERS) as response:
+            if response.status_code not in JINA_RETRY_STATUSES or attempt == JINA_MAX_RETRIES:
+                raw_content = await _read_capped_async(response)
+                break
+            delay = _retry_delay(response, attempt)
+        await asyncio.sleep(delay)
+    
+    # Clean the scraped content
+    cleaned_content = clean_content(raw_content)
+    
+    if response.is_success:
+        _cache_scrape(url, cleaned_content)
+    return cleaned_content
+
+async def close_async_client() -> None:
+    """Close the shared async client's connections (called on app shutdown)"""
+    await _async_client.aclose()
+
+JINA_SERP_URL = 'https://s.jina.ai/'
+
+# Paces async SERP searches - URL generation fires several at once, which trips per-second quotas
+# on rate-limited plans (JINA_SERP_MIN_INTERVAL); a 429 Retry-After holds back every pending search
+_serp_rate_limiter = _RateLimiter(settings.jina_serp_min_interval)
+
+def _jina_serp_request_args(search_phrase: str) -> tuple[dict, dict]:
+    """Query params and headers for a Jina SERP search"""
     params = {'q': f'{search_phrase}', 'gl': 'AU', 'location': 'Sydney', 'hl': 'en'}
     headers = {
         'Accept': 'application/json',
         'Authorization': f'Bearer jina_{settings.jina_api_key}',
         'X-Respond-With': 'no-content'
     }
-    response = requests.get(url, params=params, headers=headers)
-    return ast.literal_eval(response.text)['data'] # convert to dict then extract data 
+    return params, headers
+
+def jina_serp_scraper(search_phrase:str) -> list[dict]:
+    params, headers = _jina_serp_request_args(search_phrase)
+    response = _session.get(JINA_SERP_URL, params=params, headers=headers)
+    return response.json()['data'] # parse JSON (C-accelerated) then extract data
+
+async def jina_serp_scraper_async(search_phrase: str) -> list[dict]:
+    """Async version of jina_serp_scraper, using the shared client so many searches can run concurrently"""
+    params, headers = _jina_serp_request_args(search_phrase)
+    for attempt in range(JINA_MAX_RETRIES + 1):
+        await _serp_rate_limiter.wait()
+        response = await _async_client.get(JINA_SERP_URL, params=params, headers=headers)
+        if response.status_code not in JINA_RETRY_STATUSES or attempt == JINA_MAX_RETRIES:
+            break
+        retry_after = _retry_after_seconds(response)
+        if retry_after is not None:
+            # Every concurrent search waits this out, not just this one - avoids a burst of further 429s
+            _serp_rate_limiter.defer(retry_after)
+        else:
+            await asyncio.sleep(JINA_BACKOFF_FACTOR * 2 ** attempt)
+    return response.json()['data']
 
 if __name__ == "__main__":
     from pprint import pprint
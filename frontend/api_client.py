@@ -3,17 +3,56 @@ API client for communicating with FastAPI backend
 """
 
 import os
+import re
 from typing import Optional
+from urllib.parse import unquote
 import requests
+import streamlit as st
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import json
 
+# Endpoint functions - every call goes through the shared _session below
+__all__ = [
+    'get_projects',
+    'create_project',
+    'update_project',
+    'get_project',
+    'delete_project',
+    'generate_queries',
+    'generate_urls',
+    'get_urls',
+    'create_url',
+    'update_url',
+    'delete_url',
+    'generate_leads',
+    'start_leads_job',
+    'get_leads_job',
+    'fetch_latest_run_zip',
+    'get_latest_run_zip_url',
+    'upload_dataset',
+    'get_merged_results',
+    'fetch_merged_results_zip',
+    'generate_test_urls',
+    'get_test_urls',
+    'create_test_url',
+    'update_test_url',
+    'delete_test_url',
+    'extract_test_leads'
+]
+
 # Configuration
-BASE_URL = "http://localhost:8000"
-# Default timeout: 10 minutes (600 secs) for lead extraction operations which can process many URLs sequentially
-# Each URL can take 10-30 seconds with AI processing + scraping, so with 50 URLs this could take 8+ minutes
+# Backend URL - set LEADGEN_API_URL to point the frontend at another deployment (trailing slash is stripped)
+BASE_URL = os.getenv("LEADGEN_API_URL", "http://localhost:8000").rstrip("/")
+# Backend URL as reached from the user's browser - when set, ZIP downloads link straight to the backend
+# instead of being fetched into the Streamlit server's memory first (optional, unset by default)
+PUBLIC_API_URL = os.getenv("LEADGEN_PUBLIC_API_URL", "").rstrip("/")
+# Default timeout: 10 minutes (600 secs) for lead extraction operations which can process many URLs
+# Each URL can take 10-30 seconds with AI processing + scraping, so with 50 URLs this could take several minutes.
 TIMEOUT = 600
+# Filename from a Content-Disposition header - handles filename="x", filename=x and filename*=UTF-8''x
+# (RFC 6266, percent-encoded - see _download)
+CONTENT_DISPOSITION_FILENAME_PATTERN = re.compile(r"filename\*?=(?:UTF-8'')?[\"']?([^\"';]+)", re.IGNORECASE)
 
 # Create one shared session for connection reuse
 _session = requests.Session()
@@ -26,7 +65,9 @@ retry = Retry(
     allowed_methods=("GET", "POST", "PUT", "DELETE"),
     raise_on_status=False,
 )
-adapter = HTTPAdapter(max_retries=retry)
+# Streamlit serves each browser session from its own thread, all sharing this session -
+# keep up to 20 connections to the backend alive instead of requests' default of 10
+adapter = HTTPAdapter(max_retries=retry, pool_maxsize=20)
 _session.mount("http://", adapter)
 _session.mount("https://", adapter)
 _session.headers.update({"Accept": "application/json"})
@@ -34,8 +75,8 @@ _session.headers.update({"Accept": "application/json"})
 def _request(method: str, path: str, json_data=None, stream=False, files=None, form_data=None):
     """Make HTTP request - returns response or None on error"""
     try:
-        # Build full URL (BASE_URL already has no trailing slash, path has leading slash)
-        url = f"{BASE_URL}{path}"
+        # Build full URL (BASE_URL has no trailing slash, path has leading slash)
+        url = BASE_URL + path
         # Use files+form_data for multipart/form-data, otherwise use json_data
         if files is not None:
             response = _session.request(
@@ -47,16 +88,59 @@ def _request(method: str, path: str, json_data=None, stream=False, files=None, f
             )
         
         if response.status_code >= 200 and response.status_code < 300:
+            # Any successful write can change project counts or merged results - drop cached reads
+            if method != "GET":
+                _get_json_cached.clear()
             return response
         return None
     except Exception:
         return None
 
+class _RequestFailed(Exception):
+    """Raised inside cached reads so failures are not cached (st.cache_data doesn't cache exceptions)"""
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _get_json_cached(path: str):
+    """GET a path and return its JSON, cached for 30s - Streamlit reruns the page on every widget event"""
+    response = _request("GET", path)
+    if response is None:
+        raise _RequestFailed(path)
+    return response.json()
+
+def _download(path: str, default_filename: str):
+    """
+    Download a file from the API (shared by the ZIP endpoints).
+    
+    Args:
+        path: API path to download from
+        default_filename: Filename to use if the response has no Content-Disposition filename
+        
+    Returns:
+        (content: bytes, filename: str), or (None, None) on error
+    """
+    response = _request("GET", path, stream=True)
+    if not response:
+        return None, None
+    
+    with response:
+        # Get filename from Content-Disposition header (backend sets it)
+        match = CONTENT_DISPOSITION_FILENAME_PATTERN.search(response.headers.get("Content-Disposition", ""))
+        filename = unquote(match.group(1).strip()) if match else default_filename
+        
+        # st.download_button needs the whole file as bytes
+        return response.content, filename
+
+def _get_json(path: str, default=None):
+    """Cached GET returning default on error"""
+    try:
+        return _get_json_cached(path)
+    except _RequestFailed:
+        return default
+
 # Project endpoints
 def get_projects():
-    """Fetch all projects from the API"""
-    response = _request("GET", "/api/projects/")
-    return response.json() if response else []
+    """Fetch all projects from the API (cached for 30s)"""
+    return _get_json("/api/projects/", default=[])
 
 def create_project(project_name: str, description: Optional[str]=None, query_search_target: Optional[str]=None):
     """Create a new project via API"""
@@ -70,9 +154,8 @@ def update_project(project_id: int, **kwargs):
     return response.json() if response else None
 
 def get_project(project_id: int):
-    """Get specific project by ID"""
-    response = _request("GET", f"/api/projects/{project_id}")
-    return response.json() if response else None
+    """Get specific project by ID (cached for 30s)"""
+    return _get_json(f"/api/projects/{project_id}")
 
 def delete_project(project_id: int):
     """Delete project via API"""
@@ -97,9 +180,8 @@ def generate_urls(project_id: int, queries: list[str]):
     return response.json() if response else None
 
 def get_urls(project_id: int):
-    """Get all production URLs for a project"""
-    response = _request("GET", f"/api/projects/{project_id}/urls")
-    return response.json() if response else []
+    """Get all production URLs for a project (cached for 30s)"""
+    return _get_json(f"/api/projects/{project_id}/urls", default=[])
 
 def create_url(project_id: int, link: str, title: str = None, snippet: str = None):
     """Create a new production URL (query is automatically set to 'Manual Entry' in the backend)"""
@@ -138,31 +220,58 @@ def generate_leads(project_id: int):
     response = _request("POST", f"/api/projects/{project_id}/leads")
     return response.json() if response else None
 
+def start_leads_job(project_id: int):
+    """
+    Start lead extraction in the background on the backend and return its status straight away
+    (or the status of the run already in progress). Poll get_leads_job for progress.
+    """
+    response = _request("POST", f"/api/projects/{project_id}/leads/jobs")
+    return response.json() if response else None
+
+def get_leads_job(project_id: int):
+    """
+    Get the status of the project's background lead extraction (not cached - it changes every poll).
+    Returns {"status": "running"|"done"|"failed", "completed", "total", "leads_found", "failed",
+    "result" (same shape as generate_leads), "detail"}, {"status": "not_found"} if the backend has
+    no job for the project (e.g. it restarted), or None if the backend couldn't be reached.
+    """
+    try:
+        response = _session.get(f"{BASE_URL}/api/projects/{project_id}/leads/jobs", timeout=TIMEOUT)
+    except requests.RequestException:
+        return None
+    if response.status_code == 404:
+        return {"status": "not_found"}
+    if not response.ok:
+        return None
+    job = response.json()
+    if job.get("status") != "running":
+        # The run wrote leads/counts after start_leads_job cleared the cache - clear again once it's over
+        _get_json_cached.clear()
+    return job
+
 def fetch_latest_run_zip(project_id: int):
     """
     Fetch ZIP file containing latest run results.
     Returns (zip_content: bytes, filename: str) or (None, None) on error
     """
-    response = _request("GET", f"/api/projects/{project_id}/leads/download", stream=True)
-    
-    if response:
-        # Get filename from Content-Disposition header (backend sets it)
-        cd = response.headers.get("Content-Disposition", "")
-        # Extract filename from header (format: "attachment; filename=name.zip")
-        filename = cd.split("filename=", 1)[1].strip().strip('"').strip("'")
-        
-        return response.content, filename
-    
-    return None, None
+    return _download(f"/api/projects/{project_id}/leads/download", "leads.zip")
+
+def get_latest_run_zip_url(project_id: int) -> Optional[str]:
+    """
+    Browser-facing URL of the latest run results ZIP, so the browser downloads it from the backend directly.
+    Returns None when LEADGEN_PUBLIC_API_URL is not set (use fetch_latest_run_zip instead).
+    """
+    if not PUBLIC_API_URL:
+        return None
+    return f"{PUBLIC_API_URL}/api/projects/{project_id}/leads/download"
 
 # Dataset endpoints
 def upload_dataset(project_id: int, dataset_name: str, lead_column: str, enrichment_column_list: list[str], enrichment_column_exists: bool, csv_file):
     """Upload a CSV dataset for a project via API"""
+    # Pass the file handle itself - requests reads it straight into the multipart body,
+    # so no separate copy of the CSV is made here
     csv_file.seek(0)
-    file_content = csv_file.read()
-    csv_file.seek(0)
-    
-    files = {'csv_file': (csv_file.name, file_content, 'text/csv')}
+    files = {'csv_file': (csv_file.name, csv_file, 'text/csv')}
     form_data = {
         'dataset_name': dataset_name,
         'lead_column': lead_column,
@@ -171,31 +280,21 @@ def upload_dataset(project_id: int, dataset_name: str, lead_column: str, enrichm
     }
     
     response = _request("POST", f"/api/projects/{project_id}/datasets", files=files, form_data=form_data)
+    csv_file.seek(0)  # leave the upload readable for the page (e.g. previews) as before
     return response.json() if response else None
 
 
 # Merged results endpoints
 def get_merged_results(project_id: int):
-    """Get merged results table as JSON for displaying in frontend"""
-    response = _request("GET", f"/api/projects/{project_id}/results")
-    return response.json() if response else None
+    """Get merged results table as JSON for displaying in frontend (cached for 30s)"""
+    return _get_json(f"/api/projects/{project_id}/results")
 
 def fetch_merged_results_zip(project_id: int):
     """
     Fetch ZIP file containing merged results table.
     Returns (zip_content: bytes, filename: str) or (None, None) on error
     """
-    response = _request("GET", f"/api/projects/{project_id}/results/download", stream=True)
-    
-    if response:
-        # Get filename from Content-Disposition header (backend sets it)
-        cd = response.headers.get("Content-Disposition", "")
-        # Extract filename from header (format: "attachment; filename=name.zip")
-        filename = cd.split("filename=", 1)[1].strip().strip('"').strip("'")
-        
-        return response.content, filename
-    
-    return None, None
+    return _download(f"/api/projects/{project_id}/results/download", "merged_results.zip")
 
 # Test lead extraction prompts endpoints
 def generate_test_urls(project_id: int, query: str):
@@ -204,9 +303,8 @@ def generate_test_urls(project_id: int, query: str):
     return response.json() if response else None
 
 def get_test_urls(project_id: int):
-    """Get all test URLs for a project"""
-    response = _request("GET", f"/api/projects/{project_id}/test/urls")
-    return response.json() if response else []
+    """Get all test URLs for a project (cached for 30s)"""
+    return _get_json(f"/api/projects/{project_id}/test/urls", default=[])
 
 def create_test_url(project_id: int, link: str, title: str = None, snippet: str = None):
     """Create a new test URL"""
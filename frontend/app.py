@@ -2,11 +2,6 @@
 Main Streamlit application entry point
 """
 import streamlit as st
-from streamlit_pages.dashboard import show_dashboard
-from streamlit_pages.project_overview import show_project_overview
-from streamlit_pages.collect_leads import show_collect_leads
-from streamlit_pages.review_leads import show_review_leads
-from streamlit_pages.test_prompts import show_test_prompts
 
 def init_session_state():
     """Initialize global session state variables"""
@@ -69,16 +64,22 @@ def main():
                 st.session_state.current_page = "review_leads"
                 st.rerun()
     
-    # Main content area
+    # Main content area - pages are imported on first visit, so pandas is only loaded
+    # by the pages that use it (collect leads, review leads, test prompts)
     if st.session_state.current_page == "dashboard":
+        from streamlit_pages.dashboard import show_dashboard
         show_dashboard()
     elif st.session_state.current_page == "project_overview":
+        from streamlit_pages.project_overview import show_project_overview
         show_project_overview()
     elif st.session_state.current_page == "collect_leads":
+        from streamlit_pages.collect_leads import show_collect_leads
         show_collect_leads()
     elif st.session_state.current_page == "review_leads":
+        from streamlit_pages.review_leads import show_review_leads
         show_review_leads()
     elif st.session_state.current_page == "test_prompts":
+        from streamlit_pages.test_prompts import show_test_prompts
         show_test_prompts()
 
 if __name__ == "__main__":
@@ -3,21 +3,74 @@ Lead collection page
 """
 import streamlit as st
 import pandas as pd
-from api_client import update_project, generate_queries, generate_urls, get_urls, create_url, update_url, delete_url, generate_leads, fetch_latest_run_zip, get_project, upload_dataset
+from api_client import update_project, generate_queries, generate_urls, get_urls, create_url, update_url, delete_url, start_leads_job, get_leads_job, fetch_latest_run_zip, get_latest_run_zip_url, get_project, upload_dataset
+
+# Rows of an uploaded CSV shown in the dataset preview
+PREVIEW_ROWS = 10
+# Seconds between progress polls while lead extraction runs in the background
+EXTRACTION_POLL_SECONDS = 2
 
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
 
+def _apply_query_edits(editor_key: str):
+    """
+    Apply the queries table's edits to generated_queries (Save Queries callback - runs before the rerun).
+    Emptied rows are removed.
+    """
+    changes = st.session_state[editor_key]
+    # Row positions in the editor match the dict's insertion order it was rendered from
+    query_ids = list(st.session_state.generated_queries.keys())
+    queries = dict(st.session_state.generated_queries)
+    
+    for row, edits in changes.get("edited_rows", {}).items():
+        if "Query" in edits:
+            queries[query_ids[int(row)]] = edits["Query"]
+    for row in changes.get("deleted_rows", []):
+        queries.pop(query_ids[int(row)], None)
+    for added in changes.get("added_rows", []):
+        query_id = f"q{st.session_state.query_counter}"
+        st.session_state.query_counter += 1
+        queries[query_id] = added.get("Query")
+    
+    # Drop emptied rows - duplicates are removed by the backend when URLs are generated
+    st.session_state.generated_queries = {
+        query_id: query.strip()
+        for query_id, query in queries.items()
+        if query and query.strip()
+    }
+    st.session_state.query_message = None
+    # Change the data_editor key so the applied edits aren't replayed on top of the new table
+    st.session_state.queries_editor_version += 1
+
+def _normalize_query(query: str) -> str:
+    """
+    Query comparison key for flagging duplicates as they are added - must match normalize_query
+    in the backend's lead_utils, which does the authoritative dedupe when URLs are generated
+    """
+    return " ".join(query.lower().split())
+
+def _refresh_selected_project(project_id: int):
+    """Re-fetch the project after a write so the page shows updated stats (keeps the old copy if the fetch fails)"""
+    updated_project = get_project(project_id)
+    if updated_project:
+        st.session_state.selected_project = updated_project
+
 def _fetch_and_store_zip_data(project_id: int):
-    """Fetch ZIP file from API and store in session state"""
+    """Fetch ZIP file from API and store in session state (keyed by project, reused until the data changes)"""
     zip_content, filename = fetch_latest_run_zip(project_id)
     if zip_content and filename:
-        st.session_state["csv_data_all"] = zip_content
-        st.session_state["csv_filename_all"] = filename
+        st.session_state[f"csv_data_all_{project_id}"] = zip_content
+        st.session_state[f"csv_filename_all_{project_id}"] = filename
         return True
     return False
 
+def _clear_zip_data(project_id: int):
+    """Drop the stored ZIP after the project's URLs change, so the next download is fetched fresh"""
+    st.session_state.pop(f"csv_data_all_{project_id}", None)
+    st.session_state.pop(f"csv_filename_all_{project_id}", None)
+
 
 # =============================================================================
 # MAIN PAGE
@@ -27,8 +80,12 @@ def show_collect_leads():
     """Lead collection page"""
     project = st.session_state.selected_project
     st.markdown(f"# Lead Collection Tools: {project['project_name']}")
+    
+    # Initialize page-specific session state once per page run (not on every tab fragment rerun)
+    init_collect_leads_session_state()
         
     # Lead collection methods - 3 ways to collect leads
+    # Each tab is an st.fragment, so interacting with a widget only reruns that tab
     tab1, tab2 = st.tabs(["🌐 AI Web Search", "📁 Upload Dataset"])
     
     with tab1:
@@ -43,30 +100,22 @@ def show_collect_leads():
 
 def init_collect_leads_session_state():
     """Initialize session state variables for collect leads page"""
-    if 'generated_queries' not in st.session_state:
-        st.session_state.generated_queries = {}
-    if 'query_counter' not in st.session_state:
-        st.session_state.query_counter = 0
-    if 'num_queries' not in st.session_state:
-        st.session_state.num_queries = 3
-    if 'urls_table_just_saved' not in st.session_state:
-        st.session_state.urls_table_just_saved = False
-    if 'urls_table_save_message' not in st.session_state:
-        st.session_state.urls_table_save_message = None
-    if 'query_message' not in st.session_state:
-        st.session_state.query_message = None
-    if 'extraction_results' not in st.session_state:
-        st.session_state.extraction_results = []  # Store results from extraction run
+    st.session_state.setdefault('generated_queries', {})
+    st.session_state.setdefault('query_counter', 0)
+    st.session_state.setdefault('queries_editor_version', 0)
+    st.session_state.setdefault('num_queries', 3)
+    st.session_state.setdefault('urls_table_just_saved', False)
+    st.session_state.setdefault('urls_table_save_message', None)
+    st.session_state.setdefault('query_message', None)
+    st.session_state.setdefault('extraction_results', [])  # Store results from extraction run
 
 # =============================================================================
 # MAIN PAGE - WEB SEARCH TAB
 # =============================================================================
 
+@st.fragment
 def show_web_search_tab(project):
     """Web search tab content"""
-    # Initialize page-specific session state
-    init_collect_leads_session_state()
-    
     # Step 1: Search Queries
     st.markdown("## Step 1: Search Queries")
     st.markdown("**Generate AI queries:**")
@@ -132,14 +181,14 @@ def show_web_search_tab(project):
                     
                     generated_queries = generate_queries(project['id'], num_queries=st.session_state.num_queries)
                     if generated_queries:
-                        # Get existing queries (case-insensitive comparison)
-                        existing_queries = {q.lower().strip() for q in st.session_state.generated_queries.values()}
+                        # Get existing queries (same comparison the backend dedupes with)
+                        existing_queries = {_normalize_query(q) for q in st.session_state.generated_queries.values()}
                         
                         # Assign unique IDs to all new AI queries, skipping duplicates
                         added_count = 0
                         skipped_queries = []
                         for query in generated_queries:
-                            normalized_query = query.lower().strip()
+                            normalized_query = _normalize_query(query)
                             if normalized_query not in existing_queries:
                                 query_id = f"q{st.session_state.query_counter}"
                                 st.session_state.query_counter += 1
@@ -169,11 +218,10 @@ def show_web_search_tab(project):
         new_query = st.text_input("Add custom query", placeholder="Enter your own search query...", key="new_query_input")
         submitted = st.form_submit_button("➕ Add Query")
         if submitted and new_query and new_query.strip():
-            # Check if query already exists (case-insensitive)
-            existing_queries = {q.lower().strip() for q in st.session_state.generated_queries.values()}
-            normalized_new_query = new_query.strip().lower()
+            # Check if query already exists (same comparison the backend dedupes with)
+            existing_queries = {_normalize_query(q) for q in st.session_state.generated_queries.values()}
             
-            if normalized_new_query in existing_queries:
+            if _normalize_query(new_query) in existing_queries:
                 # Store message in session state so it persists after rerun
                 st.session_state.query_message = f'⚠️ The query "{new_query.strip()}" is already present in the list.'
                 st.rerun()
@@ -196,38 +244,22 @@ def show_web_search_tab(project):
     if st.session_state.generated_queries:
         st.markdown("**Your search queries:**")
         
-        queries_to_delete = []
-        queries_list = list(st.session_state.generated_queries.items())  # Convert to list for display order
-        
-        for i, (query_id, query) in enumerate(queries_list):
-            query_key = f"query_{query_id}"
-            delete_key = f"remove_{query_id}"
-            
-            col1, col2 = st.columns([4, 1])
-            with col1:
-                edited_query = st.text_input(
-                    f"Query {i+1}", 
-                    value=query, 
-                    key=query_key,
-                    label_visibility="collapsed"
-                )
-                # Update the query in session state if edited
-                if edited_query.strip() != query:
-                    if edited_query.strip():  # Not empty - update it
-                        st.session_state.generated_queries[query_id] = edited_query.strip()
-                    else:  # Empty - mark for deletion
-                        queries_to_delete.append(query_id)
-            with col2:
-                if st.button("❌", key=delete_key):
-                    queries_to_delete.append(query_id)
-        
-        # Delete marked queries (simple - just remove from dict!)
-        if queries_to_delete:
-            for query_id in queries_to_delete:
-                st.session_state.generated_queries.pop(query_id, None)
-            # Clear message when queries are deleted
-            st.session_state.query_message = None
-            st.rerun()
+        # One editable table for all queries (instead of an input + delete button per query), in a form
+        # so edits are sent in one batch on save. Edits, added and deleted rows are applied in the
+        # save button's callback, before the rerun starts
+        queries_df = pd.DataFrame({'Query': list(st.session_state.generated_queries.values())})
+        queries_editor_key = f"queries_editor_{st.session_state.queries_editor_version}"
+        with st.form("edit_queries_form", clear_on_submit=False):
+            st.data_editor(
+                queries_df,
+                use_container_width=True,
+                num_rows="dynamic",
+                key=queries_editor_key,
+                column_config={
+                    "Query": st.column_config.TextColumn("Query", width="large")
+                }
+            )
+            st.form_submit_button("💾 Save Queries", on_click=_apply_query_edits, args=(queries_editor_key,))
 
     # Step 2: Generate URLs (always visible)
     st.markdown("---")
@@ -249,11 +281,13 @@ def show_web_search_tab(project):
                 st.session_state.urls_table_save_message = None
             
             with st.spinner("🔍 Generating URLs from queries..."):
-                # Convert dict to list for API call
+                # Convert dict to list for API call - the backend drops duplicate queries
                 queries_list = list(st.session_state.generated_queries.values())
                 urls_result = generate_urls(project['id'], queries_list)
                 
                 if urls_result.get('success'):
+                    # New queries and URLs are in the ZIP - the stored one is out of date
+                    _clear_zip_data(project['id'])
                     urls_info = urls_result.get('urls_result', {})
                     st.success(f"✅ Generated {urls_info.get('urls_added', 0)} URLs from {urls_info.get('queries_processed', 0)} search queries")
                     st.rerun()
@@ -437,6 +471,8 @@ def show_web_search_tab(project):
                         summary.append(f"Deleted {len(deleted_ids)} URL(s)")
                     # Store message in session state so it persists across rerun
                     st.session_state.urls_table_save_message = f"✅ Saved! {' | '.join(summary)}"
+                    # The stored ZIP no longer matches the URLs table
+                    _clear_zip_data(project['id'])
                     # Toggle the flag to change the data_editor key, forcing a reset
                     st.session_state.urls_table_just_saved = not st.session_state.urls_table_just_saved
                     st.rerun()
@@ -447,37 +483,35 @@ def show_web_search_tab(project):
     st.markdown("---")
     st.markdown("## Step 3: Extract Leads")
     
+    # Set while a lead extraction runs on the backend for this project
+    extraction_running_key = f"extraction_running_{project['id']}"
+    
     if not urls:
         st.info("ℹ️ Generate URLs in Step 2 before you can extract leads.")
         st.button("🤖 Extract Leads", disabled=True)
     else:
         # Show button - "Re-run Extraction" if results exist, otherwise "Extract Leads"
         button_text = "🔄 Re-run Extraction" if st.session_state.extraction_results else "🤖 Extract Leads"
-        if st.button(button_text):
+        if st.button(button_text, disabled=st.session_state.get(extraction_running_key, False)):
             # Clear previous results and queries when starting new extraction
             st.session_state.extraction_results = []
             st.session_state.generated_queries = {}
             st.session_state.query_counter = 0
             st.session_state.query_message = None
             
-            with st.spinner("🤖 Extracting leads from URLs (this may take several minutes)..."):
-                leads_result = generate_leads(project['id'])
-                
-                if leads_result.get('success'):
-                    # Store results in session state
-                    extracted_leads = leads_result.get('extracted_leads', [])
-                    st.session_state.extraction_results = extracted_leads
-                    
-                    # Refresh project data to get updated stats
-                    st.session_state.selected_project = get_project(project['id'])
-                    
-                    # Automatically fetch ZIP file after successful extraction
-                    with st.spinner("📥 Preparing download..."):
-                        _fetch_and_store_zip_data(project['id'])
-                    
-                    st.rerun()
-                else:
-                    st.error(f"❌ Failed to extract leads")
+            if start_leads_job(project['id']):
+                st.session_state[extraction_running_key] = True
+            else:
+                st.error("❌ Failed to start lead extraction")
+    
+    # Show progress of a running extraction - it runs on the backend, so the rest of the
+    # page stays usable while only the progress fragment polls
+    extraction_message = st.session_state.pop('extraction_message', None)
+    if extraction_message:
+        level, text = extraction_message
+        getattr(st, level)(text)
+    if st.session_state.get(extraction_running_key):
+        _show_extraction_progress(project)
     
     # Display extraction results if they exist
     if st.session_state.extraction_results:
@@ -589,10 +623,15 @@ def show_web_search_tab(project):
     # Use fresh project data from session state (may have been updated during this run)
     project = st.session_state.selected_project
     has_data = project.get('leads_collected', 0) > 0
+    zip_url = get_latest_run_zip_url(project['id'])
     
-    if has_data:
+    if has_data and zip_url:
+        # The browser downloads the ZIP from the backend - nothing is held in session state
+        st.link_button("📦 Download All Results (ZIP)", url=zip_url, use_container_width=True)
+    elif has_data:
         # Check if ZIP data is already in session state
-        has_csv_data = "csv_data_all" in st.session_state and st.session_state.get("csv_data_all") is not None
+        csv_data_key = f"csv_data_all_{project['id']}"
+        has_csv_data = st.session_state.get(csv_data_key) is not None
         
         if not has_csv_data:
             # Show button to load downloads
@@ -609,8 +648,8 @@ def show_web_search_tab(project):
             download_key = "dl_serp"
             st.download_button(
                 label="📦 Download All Results (ZIP)",
-                data=st.session_state["csv_data_all"],
-                file_name=st.session_state.get("csv_filename_all", "serp_results.zip"),
+                data=st.session_state[csv_data_key],
+                file_name=st.session_state.get(f"csv_filename_all_{project['id']}", "serp_results.zip"),
                 mime="application/zip",
                 key=download_key,
                 use_container_width=True
@@ -620,7 +659,7 @@ def show_web_search_tab(project):
             st.info("📥 Click 'Load Downloads' above to prepare the download file.")
     else:
         st.info("ℹ️ No data available yet. Run a web search to generate downloadable CSV files.")
-
+    
     # # Test Prompts button at the top
     # if st.button("🧪 Test Extraction Prompts", help="Test your lead features prompts before running the full extraction"):
     #     st.session_state.current_page = "test_prompts"
@@ -629,6 +668,59 @@ def show_web_search_tab(project):
     # # Lead features input boxes (read-only - edit in test prompts page)
     # st.info("💡 To edit lead features, use the 'Test Extraction Prompts' button above or go to the Test Prompts page.")
 
+@st.fragment(run_every=EXTRACTION_POLL_SECONDS)
+def _show_extraction_progress(project):
+    """
+    Poll the running extraction job and show its progress. Only this fragment reruns on the
+    poll interval; the whole app reruns once the job finishes so the page picks up the results.
+    """
+    extraction_running_key = f"extraction_running_{project['id']}"
+    job = get_leads_job(project['id'])
+    if job is None:
+        # Backend unreachable for this poll - keep polling, the run carries on server-side
+        st.warning("⚠️ Couldn't reach the backend to check extraction progress - retrying...")
+    elif job.get('status') == 'not_found':
+        # The backend no longer knows the run (e.g. it restarted) - the outcome is unknown, not failed
+        del st.session_state[extraction_running_key]
+        _refresh_selected_project(project['id'])
+        # Store message in session state so it persists after rerun
+        st.session_state.extraction_message = ("warning", "⚠️ Lead extraction status is no longer available (the backend may have restarted). Re-run extraction to process any URLs that are still unprocessed.")
+        st.rerun()
+    elif job.get('status') == 'failed':
+        del st.session_state[extraction_running_key]
+        error_detail = job.get('detail')
+        st.session_state.extraction_message = ("error", f"❌ Failed to extract leads" + (f": {error_detail}" if error_detail else ""))
+        st.rerun()
+    elif job.get('status') == 'done':
+        del st.session_state[extraction_running_key]
+        leads_result = job.get('result') or {}
+        # Store results in session state
+        st.session_state.extraction_results = leads_result.get('extracted_leads', [])
+        
+        # Refresh project data to get updated stats
+        _refresh_selected_project(project['id'])
+        
+        # Automatically fetch ZIP file after successful extraction (not needed when the browser
+        # downloads it from the backend directly)
+        if not get_latest_run_zip_url(project['id']):
+            with st.spinner("📥 Preparing download..."):
+                _fetch_and_store_zip_data(project['id'])
+        
+        st.rerun()
+    else:
+        # Running totals, updated as each URL finishes (final numbers are shown in Extraction Results)
+        st.info("🤖 Extracting leads from URLs (this may take several minutes)...")
+        if job.get('total'):
+            st.progress(job['completed'] / job['total'], text=f"{job['completed']}/{job['total']} URLs done")
+        metric_col1, metric_col2, metric_col3 = st.columns(3)
+        with metric_col1:
+            st.metric("URLs Done", f"{job.get('completed', 0)}/{job.get('total', 0)}")
+        with metric_col2:
+            st.metric("Leads Found", job.get('leads_found', 0))
+        with metric_col3:
+            st.metric("URLs Failed", job.get('failed', 0))
+
+@st.fragment
 def show_upload_dataset_tab(project):
     """Upload dataset tab content"""
     st.markdown("#### 📁 Upload Existing Dataset")
@@ -646,14 +738,15 @@ def show_upload_dataset_tab(project):
     if uploaded_file is not None:
         st.success(f"✅ File uploaded: {uploaded_file.name}")
         
-        # Preview data to help identify columns
+        # Preview data to help identify columns - only the header and first rows are parsed
+        # (this runs on every rerun; the full file is parsed by the backend on upload)
         try:
             uploaded_file.seek(0)
-            df = pd.read_csv(uploaded_file)
+            df = pd.read_csv(uploaded_file, nrows=PREVIEW_ROWS)
             uploaded_file.seek(0)
             
             st.markdown("#### 📊 Data Preview")
-            st.dataframe(df.head(10), use_container_width=True)
+            st.dataframe(df, use_container_width=True)
             
             # Upload form
             st.markdown("#### ⚙️ Dataset Configuration")
@@ -795,9 +888,7 @@ def show_upload_dataset_tab(project):
                                     del st.session_state[enrichment_columns_key]
                                 
                                 # Refresh project data in session state to show updated stats
-                                updated_project = get_project(project['id'])
-                                if updated_project:
-                                    st.session_state.selected_project = get_project(project['id'])
+                                _refresh_selected_project(project['id'])
                             else:
                                 st.error("❌ Failed to upload dataset. Please try again.")
                         except Exception as e:
@@ -86,6 +86,11 @@ def show_dashboard():
                         if st.button("💾 Save", key=f"save_{project['id']}", help="Save changes", use_container_width=True):
                             textarea_key = f"textarea_{project['id']}"
                             new_description = st.session_state.get(textarea_key, project.get('description', ''))
+                            # Unchanged notes - just leave edit mode, no need to call the API
+                            if new_description == (project.get('description') or ''):
+                                del st.session_state[edit_key]
+                                st.session_state.pop(textarea_key, None)
+                                st.rerun()
                             with st.spinner("Updating project..."):
                                 result = update_project(project['id'], description=new_description)
                                 if result: